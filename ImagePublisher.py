@@ -0,0 +1,695 @@
+"""
+ImagePublisher: streams camera frames over ZMQ for ImageSender.
+
+Kept free of spaceteams so the same publisher can be driven offline (see
+ImageReplay.py); log messages go through any object with spaceteams'
+logger_info/logger_warn/logger_error methods, Python logging by default.
+"""
+import logging
+import os
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import zmq
+
+from ImageTransport import (TRANSPORT_SINGLE, TRANSPORT_MULTIPART, TRANSPORT_SHM, TRANSPORTS, STREAM_CODECS,
+                            LOSSY_CODECS, STREAM_IDS, DEPTH_FORMATS, HEADER_SIZE, FrameHeader, FrameTrace, ShmFrameRing, depth_nodata,
+                            legacy_header, make_codec, pack_shm_notification, send_frame_multipart, unpack_ack)
+
+
+class StdLog:
+    """spaceteams-style logger_* methods on top of Python logging."""
+    def __init__(self, name: str = "ImagePublisher"):
+        self._logger = logging.getLogger(name)
+
+    def logger_info(self, msg: str) -> None:
+        self._logger.info(msg)
+
+    def logger_warn(self, msg: str) -> None:
+        self._logger.warning(msg)
+
+    def logger_error(self, msg: str) -> None:
+        self._logger.error(msg)
+
+
+#############################
+# Camera image publisher using ZMQ and OpenCV
+####################
+@dataclass
+class CameraConfig:
+    width: int = 640
+    height: int = 480
+
+DEBUG_IMG_FPS = 30.0
+
+
+@dataclass
+class ChannelConfig:
+    port: int = 55556
+    sndhwm: int = 2  # small HWM (+ CONFLATE where possible) => latest only
+    sndbuf: int = 2*1024*1024
+
+
+@dataclass
+class ViewConfig:
+    """A derived view of a stream, published on its own port."""
+    port: int
+    level: int = 0  # pyramid level: downsampled by 2**level with area averaging
+    roi: Optional[Tuple[int, int, int, int]] = None  # x, y, width, height in full-resolution pixels
+
+
+def parse_views(pyramid_ports: str, rois: str) -> List[ViewConfig]:
+    """Build ViewConfigs from simconf-style strings.
+
+    Args:
+        pyramid_ports (str): Comma-separated ports for levels 1, 2, ..., e.g. "55560,55561"
+        rois (str): Semicolon-separated "x,y,width,height[,level]@port", e.g. "0,192,512,128@55565"
+    """
+    views = [ViewConfig(int(p), level=i + 1) for i, p in enumerate(pyramid_ports.split(",")) if p.strip()]
+    for spec in filter(str.strip, rois.split(";")):
+        box, port = spec.split("@")
+        values = [int(v) for v in box.split(",")]
+        if len(values) not in (4, 5):
+            raise ValueError(f"Bad ROI '{spec}', expected x,y,width,height[,level]@port")
+        views.append(ViewConfig(int(port), level=values[4] if len(values) == 5 else 0, roi=tuple(values[:4])))
+    return views
+
+
+def parse_stream_ports(spec: str) -> Dict[str, int]:
+    """Parse simconf-style "STREAM=port,..." (e.g. "RGB=55570,DEPTH=55571") into {stream: port}."""
+    ports = {}
+    for item in filter(str.strip, spec.split(",")):
+        stream, port = item.split("=")
+        stream = stream.strip().upper()
+        if stream not in STREAM_IDS:
+            raise ValueError(f"Unknown stream '{stream}' in '{spec}', expected one of {tuple(STREAM_IDS)}")
+        ports[stream] = int(port)
+    return ports
+
+
+def area_downsample_2x(frame: np.ndarray, nodata: Optional[float] = None) -> np.ndarray:
+    """Halve both dimensions by averaging 2x2 blocks (an odd last row/column is dropped).
+
+    With `nodata`, pixels at or above it are left out of the average, and a block
+    with no valid pixel stays `nodata`.
+    """
+    h, w = frame.shape[0] // 2, frame.shape[1] // 2
+    blocks = frame[:2*h, :2*w].reshape((h, 2, w, 2) + frame.shape[2:])
+    if nodata is not None:
+        valid = blocks < nodata
+        count = valid.sum(axis=(1, 3), dtype=np.uint8)
+        total = np.where(valid, blocks, 0).sum(axis=(1, 3), dtype=np.float32)
+        out = np.full(total.shape, nodata, dtype=frame.dtype)
+        return np.divide(total, count, out=out, where=count > 0, casting="unsafe")
+    if np.issubdtype(frame.dtype, np.integer):
+        total = blocks.sum(axis=(1, 3), dtype=np.uint32)
+        return ((total + 2) >> 2).astype(frame.dtype)  # rounded mean
+    return blocks.mean(axis=(1, 3), dtype=np.float32).astype(frame.dtype, copy=False)
+
+
+class StreamChannel:
+    """One publishing socket (and shm ring) carrying one or more streams, with its own drop accounting.
+
+    Conflated channels keep only the newest frame by design, and ZMQ doesn't say
+    when it replaces one, so `dropped` is only counted on non-conflated channels
+    (`counts_drops`), where a full HWM makes the send fail.
+    """
+    def __init__(self, socket: zmq.Socket, config: ChannelConfig, conflated: bool = False):
+        self.socket = socket
+        self.config = config
+        self.port = config.port
+        self.counts_drops = not conflated
+
+        # Shared-memory ring for the shm transport, created on the first frame
+        self.shm_ring: Optional[ShmFrameRing] = None
+        self.shm_generation = 0
+
+        # Stats
+        self.sent = 0
+        self.dropped = 0  # zmq.Again: a subscriber's HWM is full (non-conflated channels only)
+        self.last_drop_warning = 0.0
+        self.bytes_sent = 0
+        self.last_time = time.time()
+        self.frames_count = 0
+
+
+def _wait_for_subscriber(pub_socket: zmq.Socket, timeout_s: float = 2.0) -> bool:
+    """
+    Robust, bounded wait for a TCP peer to connect to the PUB socket.
+    Uses a monitor + poller with a hard wall-clock timeout.
+    Returns True if we saw EVENT_ACCEPTED, else False after timeout.
+    Set env ST_ZMQ_NOWAIT=1 to skip waiting entirely.
+    """
+    try:
+        if os.getenv("ST_ZMQ_NOWAIT") == "1" or timeout_s <= 0:
+            return False
+
+        mon_addr = "inproc://pub_mon"
+        # Listen for ACCEPTED (peer connected) plus a few harmless extras
+        pub_socket.monitor(mon_addr,
+                           zmq.EVENT_ACCEPTED | zmq.EVENT_LISTENING | zmq.EVENT_CONNECT_DELAYED)
+        mon = pub_socket.get_monitor_socket()
+
+        # Use a poller instead of relying solely on RCVTIMEO
+        poller = zmq.Poller()
+        poller.register(mon, zmq.POLLIN)
+
+        deadline = time.time() + timeout_s
+        accepted = False
+
+        while time.time() < deadline:
+            # Poll in short slices so KeyboardInterrupt is responsive
+            remaining_ms = max(1, int((deadline - time.time()) * 1000))
+            events = dict(poller.poll(min(remaining_ms, 100)))
+            if events.get(mon) == zmq.POLLIN:
+                try:
+                    frames = mon.recv_multipart(zmq.NOBLOCK)
+                except zmq.Again:
+                    continue
+                if not frames:
+                    continue
+                # First frame encodes event id and value; event id is the first 2 bytes (uint16 LE)
+                raw = frames[0]
+                if len(raw) >= 2:
+                    event_id = int.from_bytes(raw[:2], "little")
+                    if event_id == zmq.EVENT_ACCEPTED:
+                        accepted = True
+                        break
+            # loop until deadline
+
+        return accepted
+
+    except Exception as e:
+        # If anything goes weird with monitors, just don't block startup
+        try:
+            StdLog().logger_warn(f"_wait_for_subscriber: monitor fallback due to: {e}")
+        except Exception:
+            pass
+        return False
+    finally:
+        # Clean up the monitor if it was enabled
+        try:
+            mon.close(0)
+        except Exception:
+            pass
+        try:
+            pub_socket.disable_monitor()
+        except Exception:
+            pass
+
+
+class ImagePublisher:
+    def __init__(self, host: str = "0.0.0.0", port: int = 55556, transport: str = TRANSPORT_SINGLE,
+                 codecs: Optional[Dict[str, str]] = None, quality: int = -1, shm_slots: int = 4,
+                 channels: Optional[Dict[str, ChannelConfig]] = None,
+                 views: Optional[Dict[str, List[ViewConfig]]] = None, depth_format: str = "f32_cm",
+                 ack_port: int = 0, log=None):
+        """Initialize the image publisher with configurable host and port.
+
+        Args:
+            host (str): Host address to bind to
+            port (int): Port number to use
+            transport (str): "single" sends header+pixels as one message,
+                "multipart" sends them as separate frames without copying the pixels,
+                "shm" writes frames into a shared-memory ring and only sends notifications
+            codecs (Dict[str, str]): Payload codec per stream, e.g. {"RGB": "jpeg", "DEPTH": "png16_mm"};
+                anything other than "raw" needs the multipart or shm transport
+            quality (int): Codec quality (JPEG/WebP 0-100, zstd level); < 0 for codec defaults
+            shm_slots (int): Ring slots for the shm transport
+            channels (Dict[str, ChannelConfig]): Per-stream channel settings; streams on
+                different ports get their own socket so one can't displace the other under
+                CONFLATE/HWM. Unlisted RGB/depth share the default channel on `port`, which
+                then isn't conflated (ZMQ would drop one stream's frames for the other's).
+                POINTS always needs an entry.
+            views (Dict[str, List[ViewConfig]]): Downsampled levels and ROIs to publish per
+                stream, each on its own port (see `parse_views`)
+            depth_format (str): Depth pixel format that will be published (see
+                ImageTransport.DEPTH_FORMATS); compact formats need a binary-header transport
+            ack_port (int): If non-zero, accept subscriber ACKs (ImageTransport.pack_ack) on
+                this port; `poll_acks` counts them per stream
+            log: Object with logger_info/logger_warn/logger_error (e.g. the spaceteams
+                module); defaults to Python logging
+        """
+        self.log = log if log is not None else StdLog()
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport '{transport}', expected one of {TRANSPORTS}")
+        self.transport = transport
+
+        self.codecs = {}
+        for frame_type, name in (codecs or {}).items():
+            if name not in STREAM_CODECS[frame_type]:
+                raise ValueError(f"Codec '{name}' not supported for {frame_type}, expected one of {STREAM_CODECS[frame_type]}")
+            if name != "raw" and transport == TRANSPORT_SINGLE:
+                raise ValueError(f"Codec '{name}' needs the multipart transport (the legacy header has no codec field)")
+            self.codecs[frame_type] = make_codec(name, quality)
+        self.shm_slots = shm_slots
+
+        if depth_format not in DEPTH_FORMATS:
+            raise ValueError(f"Unknown depth format '{depth_format}', expected one of {tuple(DEPTH_FORMATS)}")
+        if depth_format != "f32_cm" and transport == TRANSPORT_SINGLE:
+            raise ValueError(f"Depth format '{depth_format}' needs the multipart or shm transport "
+                             "(the legacy header implies float32 cm)")
+        self.depth_format = depth_format
+        if "POINTS" in (channels or {}) and transport == TRANSPORT_SINGLE:
+            raise ValueError("The POINTS stream needs the multipart or shm transport (no legacy header for it)")
+
+        # One channel per distinct port, and the streams each one carries
+        configs = {port: ChannelConfig(port)}
+        port_streams: Dict[int, set] = {port: {s for s in ("RGB", "DEPTH") if s not in (channels or {})}}
+        for stream, config in (channels or {}).items():
+            configs.setdefault(config.port, config)
+            port_streams.setdefault(config.port, set()).add(stream)
+        for view in (v for stream_views in (views or {}).values() for v in stream_views):
+            if view.port in configs:
+                raise ValueError(f"View port {view.port} is already in use; every view needs its own port")
+            configs[view.port] = ChannelConfig(view.port)
+            port_streams[view.port] = {"view"}
+        self.context = zmq.Context()
+        self.context.setsockopt(zmq.MAX_SOCKETS, len(configs) + (1 if ack_port else 0))
+        # CONFLATE drops multipart messages, so the multipart transport relies on
+        # the small HWM alone to stay close to latest-only
+        conflated = {p: len(port_streams[p]) <= 1 and transport != TRANSPORT_MULTIPART for p in configs}
+        self.channels: Dict[int, StreamChannel] = {
+            p: StreamChannel(self._setup_socket(host, c, conflate=conflated[p]), c, conflated[p])
+            for p, c in configs.items()
+        }
+        self.default_channel = self.channels[port]
+        self.ack_socket: Optional[zmq.Socket] = None
+        if ack_port:
+            self.ack_socket = self.context.socket(zmq.PULL)
+            self.ack_socket.setsockopt(zmq.LINGER, 0)
+            self.ack_socket.bind(f"tcp://{host}:{ack_port}")
+        self.acked: Dict[str, int] = {}  # ACKs received per stream
+        self.send_failures: Dict[str, int] = {}  # frames and views lost to a full HWM, per stream (non-conflated channels)
+        self.stream_channels: Dict[str, StreamChannel] = {
+            stream: self.channels[c.port] for stream, c in (channels or {}).items()
+        }
+        # stream -> [(view, channel, ROI number)], ordered by level so the pyramid is built top-down
+        self.views: Dict[str, List[Tuple[ViewConfig, StreamChannel, int]]] = {}
+        for stream, stream_views in (views or {}).items():
+            numbered, roi = [], 0
+            for view in stream_views:
+                if view.roi is not None:
+                    roi += 1
+                numbered.append((view, self.channels[view.port], roi if view.roi is not None else 0))
+            self.views[stream] = sorted(numbered, key=lambda entry: entry[0].level)
+        
+        # Store camera configurations
+        self.rgb_config = None
+        self.depth_config = None
+        self._rgb_grid = None
+        self._depth_radius = None
+        
+        self.frame_count = 0  # Used for generating dynamic patterns
+
+        # Per-stream header state: sequence numbers let consumers detect drops,
+        # the intrinsics revision changes whenever the projection matrix does
+        self.sequences: Dict[str, int] = {}
+        self.projections: Dict[str, np.ndarray] = {}
+        self.intrinsics_revs: Dict[str, int] = {}
+
+    def _setup_socket(self, host: str, config: ChannelConfig, conflate: bool = True) -> zmq.Socket:
+        """Setup and configure the ZMQ socket with optimal settings.
+
+        `conflate` is for single-part channels that carry a single stream; on a
+        shared one CONFLATE would let a depth frame displace the RGB frame just
+        before it. Other channels are XPUB sockets with XPUB_NODROP: a plain PUB
+        silently discards frames for a subscriber whose HWM is full, while this
+        makes the send fail, so the publisher can count the loss (`dropped`,
+        `send_failures`) and back off. The frame is then skipped for every
+        subscriber of the channel, not just the slow one.
+        """
+        if conflate:
+            socket_ = self.context.socket(zmq.PUB)
+        else:
+            socket_ = self.context.socket(zmq.XPUB)
+            socket_.setsockopt(zmq.XPUB_NODROP, 1)
+
+        # Configure socket for high-throughput streaming
+        socket_.setsockopt(zmq.SNDHWM, config.sndhwm)   # small HWM + CONFLATE => latest only
+        socket_.setsockopt(zmq.RCVHWM, 2)
+        socket_.setsockopt(zmq.LINGER, 0)
+        if conflate:
+            socket_.setsockopt(zmq.CONFLATE, 1)  # Only keep latest message
+        socket_.setsockopt(zmq.SNDBUF, config.sndbuf)
+        socket_.setsockopt(zmq.TCP_KEEPALIVE, 1)
+        socket_.setsockopt(zmq.TCP_KEEPALIVE_IDLE, 120)
+        socket_.setsockopt(zmq.IMMEDIATE, 1)  # don't queue if no peer
+
+        endpoint = f"tcp://{host}:{config.port}"
+        socket_.bind(endpoint)
+        self.log.logger_info(f"Publisher bound to {endpoint}")
+
+        # ---> Key addition: wait briefly for a TCP accept, then small grace
+        # if _wait_for_subscriber(socket_, timeout_s=2.0):
+        #     self.log.logger_info("Subscriber connected (TCP). Waiting 200ms for SUBSCRIBE to apply...")
+        #     time.sleep(0.2)
+        # else:
+        #     self.log.logger_info("No subscriber detected within timeout; publishing anyway (early msgs may be dropped).")
+
+        return socket_
+
+
+    def setup_rgb_camera(self, config: CameraConfig = CameraConfig()) -> bool:
+        """Setup RGB camera configuration.
+
+        Args:
+            config (CameraConfig): Camera configuration parameters
+
+        Returns:
+            bool: True if setup was successful
+        """
+        self.rgb_config = config
+        # Test-pattern grids only depend on the resolution, so build them once
+        x = np.linspace(0, 2*np.pi, config.width, dtype=np.float32)
+        y = np.linspace(0, 2*np.pi, config.height, dtype=np.float32)
+        self._rgb_grid = np.meshgrid(x, y)
+        self.log.logger_info(f"RGB camera configured for {config.width}x{config.height} @ {DEBUG_IMG_FPS} DEBUG_IMG_FPS")
+        return True
+
+    def setup_depth_camera(self, config: CameraConfig = CameraConfig()) -> bool:
+        """Setup depth camera configuration.
+
+        Args:
+            config (CameraConfig): Camera configuration parameters
+
+        Returns:
+            bool: True if setup was successful
+        """
+        self.depth_config = config
+        x = np.linspace(0, 2*np.pi, config.width, dtype=np.float32)
+        y = np.linspace(0, 2*np.pi, config.height, dtype=np.float32)
+        X, Y = np.meshgrid(x, y)
+        self._depth_radius = np.sqrt((X - config.width / 2)**2 + (Y - config.height / 2)**2)
+        self.log.logger_info(f"Depth camera configured for {config.width}x{config.height} @ {DEBUG_IMG_FPS} DEBUG_IMG_FPS")
+        return True
+
+    def _generate_rgb_frame(self) -> np.ndarray:
+        """Generate a dummy RGB frame with a moving pattern."""
+        if not self.rgb_config:
+            return None
+            
+        # Create a moving color pattern
+        X, Y = self._rgb_grid
+        
+        # Create moving waves for each color channel
+        t = self.frame_count * 0.1
+        r = np.sin(X + t) * 128 + 128
+        g = np.sin(Y - t) * 128 + 128
+        b = np.sin(X + Y + t) * 128 + 128
+        
+        # Combine channels and ensure uint8 format
+        frame = np.stack([b, g, r], axis=2).astype(np.uint8)
+        return frame
+
+    def _generate_depth_frame(self) -> np.ndarray:
+        """Generate a dummy HxW float32 depth frame with a moving pattern."""
+        if not self.depth_config:
+            return None
+            
+        # Create a moving depth pattern (single channel)
+        t = self.frame_count * 0.05
+        # Create a circular wave pattern, in cm like the real depth stream
+        frame = (np.sin(self._depth_radius * 0.1 - t) * 128 + 128).astype(np.float32)
+        return frame
+
+    def _channel(self, frame_type: str) -> StreamChannel:
+        return self.stream_channels.get(frame_type, self.default_channel)
+
+    def _get_shm_ring(self, channel: StreamChannel, nbytes: int) -> ShmFrameRing:
+        """Ring whose slots fit `nbytes`; replaced by a bigger one (new name) when frames outgrow it."""
+        if channel.shm_ring is None or channel.shm_ring.slot_bytes < nbytes:
+            slot_bytes = nbytes
+            if self.rgb_config:
+                slot_bytes = max(slot_bytes, self.rgb_config.width * self.rgb_config.height * 3)
+            if self.depth_config:
+                itemsize = np.dtype(DEPTH_FORMATS[self.depth_format][0]).itemsize
+                slot_bytes = max(slot_bytes, self.depth_config.width * self.depth_config.height * itemsize)
+            if channel.shm_ring is not None:
+                channel.shm_ring.close()
+            channel.shm_generation += 1
+            name = f"stu3_img_{channel.port}_{channel.shm_generation}"
+            channel.shm_ring = ShmFrameRing(name, self.shm_slots, slot_bytes, create=True)
+            self.log.logger_info(f"Shared-memory ring '{name}': {self.shm_slots} slots of {channel.shm_ring.slot_bytes} bytes")
+        return channel.shm_ring
+
+    def _update_intrinsics(self, frame_type: str, projection: Optional[np.ndarray]) -> int:
+        """Track the projection matrix of a stream and return its revision."""
+        if projection is None:
+            return self.intrinsics_revs.get(frame_type, 0)
+        last = self.projections.get(frame_type)
+        if last is None or not np.array_equal(last, projection):
+            self.projections[frame_type] = projection
+            self.intrinsics_revs[frame_type] = self.intrinsics_revs.get(frame_type, 0) + 1
+        return self.intrinsics_revs[frame_type]
+
+    def _send_frame(self, frame: np.ndarray, frame_type: str, capture_id: int = 0,
+                    sim_time_ns: int = 0, projection: Optional[np.ndarray] = None,
+                    trace: Optional[FrameTrace] = None, pair_id: int = 0) -> Optional[zmq.MessageTracker]:
+        """Send a frame with header indicating frame type and dimensions, then its derived views.
+
+        Args:
+            frame (np.ndarray): HxWx3 uint8 RGB, HxW depth pixels or 1xNx3 float32 points
+            frame_type (str): "RGB", "DEPTH" or "POINTS"
+            capture_id (int): CaptureID the frame came from
+            sim_time_ns (int): SimClock capture time in ns (see `sim_time_to_ns`)
+            projection (np.ndarray): Camera projection matrix, flattened to float64
+            trace (FrameTrace): If given, its "encoded" and "sent" points are marked
+            pair_id (int): RGB-D pair the frame belongs to (binary headers only), 0 if unpaired
+
+        Returns:
+            Optional[zmq.MessageTracker]: Set when ZMQ still references `frame`'s buffer
+                (raw multipart send); the buffer must not be reused until it is done
+        """
+        # Convert frame to contiguous array so it can be sent straight from its buffer
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+
+        if frame_type not in STREAM_IDS:
+            self.log.logger_error(f"Unknown frame type: {frame_type}")
+            raise ValueError(f"Unknown frame type: {frame_type}")
+
+        sequence = self.sequences.get(frame_type, 0) + 1
+        self.sequences[frame_type] = sequence
+        if projection is not None:
+            projection = np.asarray(projection, dtype=np.float64).reshape(-1)
+        intrinsics_rev = self._update_intrinsics(frame_type, projection)
+
+        fields = dict(sequence=sequence, capture_id=capture_id, sim_time_ns=sim_time_ns,
+                      intrinsics_rev=intrinsics_rev, pair_id=pair_id)
+        tracker = self._send_view(self._channel(frame_type), frame, frame_type, fields, trace)
+        if self.views.get(frame_type):
+            # Views share the frame's sequence number; each goes to its own channel
+            for channel, pixels, view_fields in self._render_views(frame_type, frame):
+                self._send_view(channel, pixels, frame_type, dict(fields, **view_fields))
+        return tracker
+
+    def _send_view(self, channel: StreamChannel, frame: np.ndarray, frame_type: str, fields: dict,
+                   trace: Optional[FrameTrace] = None) -> Optional[zmq.MessageTracker]:
+        """Encode and send one frame (or view) on `channel` with the configured transport."""
+        tracker = None
+        try:
+            frame_time = time.time()
+            if self.transport != TRANSPORT_SINGLE:
+                codec = self.codecs.get(frame_type)
+                payload = codec.encode(frame) if codec else frame
+                header = FrameHeader.for_frame(frame_type, frame, send_time_ns=time.time_ns(),
+                                               payload_bytes=memoryview(payload).nbytes,
+                                               codec=codec.name if codec else "raw", **fields)
+                if trace is not None:
+                    trace.mark("encoded")
+            if self.transport == TRANSPORT_MULTIPART:
+                # Binary header and payload as separate frames; raw pixels are not copied
+                tracker = send_frame_multipart(channel.socket, header.pack(), payload, flags=zmq.NOBLOCK,
+                                               track=codec is None, projection=self.projections.get(frame_type))
+                nbytes = HEADER_SIZE + header.payload_bytes
+            elif self.transport == TRANSPORT_SHM:
+                # One copy into shared memory, then a tiny notification
+                ring = self._get_shm_ring(channel, header.payload_bytes)
+                slot, seq = ring.write(header, payload)
+                channel.socket.send(pack_shm_notification(ring.name, slot, seq), flags=zmq.NOBLOCK)
+                nbytes = HEADER_SIZE + header.payload_bytes
+            else:
+                if frame_type == "DEPTH" and frame.dtype != np.float32:
+                    raise ValueError(f"{frame.dtype} depth needs the multipart or shm transport "
+                                     "(the legacy header implies float32 cm)")
+                # Header format: TYPE#HEIGHT#WIDTH#CHANNELS#
+                header = legacy_header(frame_type, frame).encode('ascii')
+                # Send as a single message
+                message = header + frame.tobytes()
+                if trace is not None:
+                    trace.mark("encoded")
+                channel.socket.send(message, flags=zmq.NOBLOCK)
+                nbytes = len(message)
+            if trace is not None:
+                trace.mark("sent")
+            # self.log.logger_info(f"Sent {frame_type} frame of size {nbytes} bytes")
+            
+            # Update statistics
+            channel.sent += 1
+            channel.bytes_sent += nbytes
+            channel.frames_count += 1
+            current_time = time.time()
+            if current_time - channel.last_time > 1.0:
+                fps = channel.frames_count / (current_time - channel.last_time)
+                encode_time = (time.time() - frame_time) * 1000
+                drops = (f"dropped {channel.dropped}/{channel.sent + channel.dropped}" if channel.counts_drops
+                         else "conflated")
+                self.log.logger_info(f"{frame_type} (port {channel.port}): {fps:.1f} FPS, Encode+Send: {encode_time:.1f}ms, "
+                               f"{drops}")
+                channel.frames_count = 0
+                channel.last_time = current_time
+                
+        except zmq.Again:
+            channel.dropped += 1
+            self.send_failures[frame_type] = self.send_failures.get(frame_type, 0) + 1
+            now = time.time()
+            if now - channel.last_drop_warning > 1.0:  # a stalled subscriber fails every send
+                channel.last_drop_warning = now
+                self.log.logger_warn(f"Send buffer full on port {channel.port}, skipping {frame_type} frames "
+                                     f"({channel.dropped} so far)")
+        return tracker
+
+    def _render_views(self, frame_type: str, frame: np.ndarray):
+        """Yield (channel, pixels, header fields) for each view of `frame`.
+
+        Each pyramid level is computed once from the level above it, and ROIs
+        are cropped from the level they ask for. Views are sent without keeping
+        their trackers, so none of them may share memory with `frame`, which
+        goes back to the FramePool once the main send's tracker is done.
+        """
+        nodata = depth_nodata(frame.dtype) if frame_type == "DEPTH" else None
+        levels = [frame]
+        for view, channel, roi in self.views[frame_type]:
+            while len(levels) <= view.level:
+                levels.append(area_downsample_2x(levels[-1], nodata))
+            pixels = levels[view.level]
+            x = y = 0
+            if view.roi is not None:
+                x, y, w, h = view.roi
+                s = view.level
+                # Copy even when the slice is already contiguous (e.g. full-width rows)
+                pixels = np.array(pixels[y >> s:(y + h) >> s, x >> s:(x + w) >> s], copy=True)
+            elif view.level == 0:
+                pixels = frame.copy()
+            yield channel, pixels, dict(level=view.level, roi=roi, origin_x=x, origin_y=y)
+
+    def publish_RGB_frame(self, frame: np.ndarray, capture_id: int = 0, sim_time_ns: int = 0,
+                          projection: Optional[np.ndarray] = None,
+                          trace: Optional[FrameTrace] = None, pair_id: int = 0) -> Optional[zmq.MessageTracker]:
+        """Publish a single RGB frame."""
+        return self._send_frame(frame, "RGB", capture_id, sim_time_ns, projection, trace, pair_id)
+
+    
+    def publish_Depth_frame(self, frame: np.ndarray, capture_id: int = 0, sim_time_ns: int = 0,
+                            projection: Optional[np.ndarray] = None,
+                            trace: Optional[FrameTrace] = None, pair_id: int = 0) -> Optional[zmq.MessageTracker]:
+        """Publish a single Depth frame."""
+        return self._send_frame(frame, "DEPTH", capture_id, sim_time_ns, projection, trace, pair_id)
+
+    def publish_PointCloud(self, points: np.ndarray, capture_id: int = 0, sim_time_ns: int = 0,
+                           projection: Optional[np.ndarray] = None, pair_id: int = 0) -> Optional[zmq.MessageTracker]:
+        """Publish an Nx3 float32 XYZ point cloud (see PointCloud.py) as a 1xNx3 POINTS frame."""
+        if "POINTS" not in self.stream_channels:
+            raise ValueError("The POINTS stream needs its own channel (channels={'POINTS': ChannelConfig(port)})")
+        return self._send_frame(points.reshape(1, -1, 3), "POINTS", capture_id, sim_time_ns, projection,
+                                pair_id=pair_id)
+
+    def poll_acks(self) -> Dict[str, int]:
+        """Take every queued subscriber ACK; returns the running per-stream totals (`acked`)."""
+        if self.ack_socket is None:
+            return self.acked
+        while True:
+            try:
+                msg = self.ack_socket.recv(zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                return self.acked
+            try:
+                stream, _ = unpack_ack(msg.buffer)
+            except (ValueError, KeyError, struct.error):
+                continue
+            self.acked[stream] = self.acked.get(stream, 0) + 1
+
+    def set_quality(self, frame_type: str, quality: int) -> bool:
+        """Re-create `frame_type`'s codec at `quality`; False if its codec has no quality setting."""
+        codec = self.codecs.get(frame_type)
+        if codec is None or codec.name not in LOSSY_CODECS:
+            return False
+        if codec.quality != quality:
+            self.codecs[frame_type] = make_codec(codec.name, quality)
+        return True
+
+    # Debug function to publish test frames
+    def publish_test_frames(self) -> None:
+        """Publish frames from simulated cameras."""
+        try:
+            target_interval = 1.0 / DEBUG_IMG_FPS
+            next_frame_time = time.time()
+            
+            while True:
+                current_time = time.time()
+                if current_time < next_frame_time:
+                    # Use a shorter sleep to be more responsive
+                    time.sleep(min(0.001, next_frame_time - current_time))
+                    continue
+                
+                self.frame_count += 1
+                
+                # Pre-generate frames to reduce latency between sends
+                rgb_frame = self._generate_rgb_frame() if self.rgb_config else None
+                depth_frame = self._generate_depth_frame() if self.depth_config else None
+                
+                # Send frames as close together as possible
+                if rgb_frame is not None:
+                    self._send_frame(rgb_frame, "RGB")
+                if depth_frame is not None:
+                    self._send_frame(depth_frame, "DEPTH")
+                
+                # Calculate next frame time based on target rate
+                next_frame_time = current_time + target_interval
+
+        except KeyboardInterrupt:
+            self.log.logger_info("Shutting down...")
+        finally:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        """Release resources and close connections."""
+        if self.ack_socket is not None:
+            self.ack_socket.close()
+        for channel in self.channels.values():
+            channel.socket.close()
+            if channel.shm_ring is not None:
+                channel.shm_ring.close()
+                channel.shm_ring = None
+        self.context.term()
+
+# if __name__ == "__main__":
+#     # Example usage
+#     publisher = ImagePublisher()
+    
+#     # Configure RGB camera with custom settings
+#     rgb_config = CameraConfig(
+#         width=640,
+#         height=480,
+#         camera_id=0,
+#         fourcc='MJPG'
+#     )
+#     publisher.setup_rgb_camera(rgb_config)
+    
+#     # Configure depth camera with custom settings
+#     depth_config = CameraConfig(
+#         width=640,
+#         height=480,
+#         fps=60,  # Lower FPS for depth is typical
+#         camera_id=1,
+#         fourcc='MJPG'
+#     )
+#     publisher.setup_depth_camera(depth_config)
+
+    
+#     # Start publishing frames
+#     publisher.publish_test_frames()
@@ -0,0 +1,249 @@
+"""
+Append-only recording of published frames, and a reader for the recordings.
+
+A recording is a directory of segments. Each segment is a pair of files:
+
+    frames_NNNNN.bin  segment header, then one record per frame:
+                      FrameHeader | meta_bytes I | meta JSON | pad | payload | pad
+                      (payloads start on 64-byte boundaries so they can be viewed in place)
+    frames_NNNNN.idx  one INDEX_DTYPE entry per record, appended after the record
+
+Like ImageTransport, nothing here talks to the simulator.
+"""
+import glob
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from ImageTransport import (HEADER_SIZE, HEADER_VERSION, STREAM_IDS, STREAM_NAMES, FrameHeader, make_codec,
+                            payload_to_pixels)
+
+SEGMENT_MAGIC = b"STRC"
+# magic 4s | FrameHeader version I  (padded to 64 bytes)
+_SEGMENT_STRUCT = struct.Struct("<4sI")
+SEGMENT_HEADER_SIZE = 64
+_META_LEN = struct.Struct("<I")
+ALIGN = 64
+
+INDEX_DTYPE = np.dtype([
+    ("record_offset", "<u8"),
+    ("payload_offset", "<u8"),
+    ("payload_bytes", "<u8"),
+    ("sim_time_ns", "<i8"),
+    ("capture_id", "<u8"),
+    ("stream", "u1"),
+    ("_pad", "V7"),
+])
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+class FrameRecorder:
+    """Writes frames to a recording from a background thread.
+
+    `record()` copies the frame into a bounded queue and returns immediately, so it
+    is safe to call from the publishing path. When the queue holds more than
+    `max_queue_bytes`, the drop policy decides what is lost: "newest" rejects the
+    incoming frame, "oldest" evicts queued frames to make room. Files are flushed
+    and fsynced at most every `fsync_interval_s`, and on segment roll and close.
+    """
+    DROP_POLICIES = ("newest", "oldest")
+
+    def __init__(self, directory: str, codecs: Optional[Dict[str, str]] = None, quality: int = -1,
+                 segment_bytes: int = 1 << 30, max_queue_bytes: int = 256 << 20,
+                 fsync_interval_s: float = 1.0, drop_policy: str = "newest"):
+        """
+        Args:
+            directory (str): Recording directory; created if missing
+            codecs (Dict[str, str]): Optional per-stream codec (see ImageTransport.STREAM_CODECS), default raw
+            quality (int): Codec quality, -1 for each codec's default
+            segment_bytes (int): Start a new segment once the current one reaches this size
+            max_queue_bytes (int): Frame bytes allowed to wait for the writer
+            fsync_interval_s (float): Minimum time between fsyncs
+            drop_policy (str): "newest" or "oldest"
+        """
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{drop_policy}', expected one of {self.DROP_POLICIES}")
+        self.directory = directory
+        self.codecs = {stream: make_codec(name, quality) for stream, name in (codecs or {}).items() if name != "raw"}
+        self.segment_bytes = segment_bytes
+        self.max_queue_bytes = max_queue_bytes
+        self.fsync_interval_s = fsync_interval_s
+        self.drop_policy = drop_policy
+        os.makedirs(directory, exist_ok=True)
+
+        # Stats
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+        self._queue: deque = deque()
+        self._queued_bytes = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._segment = -1
+        self._bin = None
+        self._idx = None
+        self._offset = 0
+        self._last_fsync = time.perf_counter()
+        self._open_segment()
+
+        self._thread = threading.Thread(target=self._write_loop, name="FrameRecorder", daemon=True)
+        self._thread.start()
+
+    def record(self, stream: str, frame: np.ndarray, sequence: int = 0, capture_id: int = 0,
+               sim_time_ns: int = 0, meta: Optional[dict] = None) -> bool:
+        """Queue a copy of `frame`; returns False if it was dropped."""
+        with self._cond:
+            if self._closed:
+                return False
+            if self._queued_bytes + frame.nbytes > self.max_queue_bytes:
+                if self.drop_policy == "newest" or not self._queue:
+                    self.dropped += 1
+                    return False
+                while self._queue and self._queued_bytes + frame.nbytes > self.max_queue_bytes:
+                    evicted = self._queue.popleft()
+                    self._queued_bytes -= evicted[1].nbytes
+                    self.dropped += 1
+            self._queue.append((stream, np.array(frame, copy=True, order="C"), sequence, capture_id, sim_time_ns, meta))
+            self._queued_bytes += frame.nbytes
+            self._cond.notify()
+        return True
+
+    def _open_segment(self) -> None:
+        if self._bin is not None:
+            self._sync()
+            self._bin.close()
+            self._idx.close()
+        self._segment += 1
+        base = os.path.join(self.directory, f"frames_{self._segment:05d}")
+        self._bin = open(base + ".bin", "wb")
+        self._idx = open(base + ".idx", "wb")
+        self._bin.write(_SEGMENT_STRUCT.pack(SEGMENT_MAGIC, HEADER_VERSION).ljust(SEGMENT_HEADER_SIZE, b"\0"))
+        self._offset = SEGMENT_HEADER_SIZE
+
+    def _sync(self) -> None:
+        for f in (self._bin, self._idx):
+            f.flush()
+            os.fsync(f.fileno())
+        self._last_fsync = time.perf_counter()
+
+    def _write(self, stream: str, frame: np.ndarray, sequence: int, capture_id: int,
+               sim_time_ns: int, meta: Optional[dict]) -> None:
+        codec = self.codecs.get(stream)
+        payload = memoryview(codec.encode(frame) if codec else frame).cast("B")
+        header = FrameHeader.for_frame(stream, frame, sequence=sequence, capture_id=capture_id,
+                                       sim_time_ns=sim_time_ns, payload_bytes=payload.nbytes,
+                                       codec=codec.name if codec else "raw")
+        meta_json = json.dumps(meta or {}).encode("utf-8")
+        prefix = header.pack() + _META_LEN.pack(len(meta_json)) + meta_json
+        prefix = prefix.ljust(_aligned(len(prefix)), b"\0")
+        record_len = len(prefix) + _aligned(payload.nbytes)
+
+        if self._offset > SEGMENT_HEADER_SIZE and self._offset + record_len > self.segment_bytes:
+            self._open_segment()
+        record_offset = self._offset
+        self._bin.write(prefix)
+        self._bin.write(payload)
+        self._bin.write(b"\0" * (record_len - len(prefix) - payload.nbytes))
+        self._offset += record_len
+
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        entry[0] = (record_offset, record_offset + len(prefix), payload.nbytes, sim_time_ns, capture_id,
+                    STREAM_IDS[stream], b"")
+        self._idx.write(entry.tobytes())
+        self.recorded += 1
+        self.bytes_written += record_len
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._cond:
+                if not self._queue and not self._closed:
+                    self._cond.wait(self.fsync_interval_s)
+                if not self._queue and self._closed:
+                    return
+                item = self._queue.popleft() if self._queue else None
+                if item is not None:
+                    self._queued_bytes -= item[1].nbytes
+            if item is not None:
+                self._write(*item)
+            if time.perf_counter() - self._last_fsync >= self.fsync_interval_s:
+                self._sync()
+
+    def close(self) -> None:
+        """Write out everything queued, then fsync and close the files."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._sync()
+        self._bin.close()
+        self._idx.close()
+
+
+class RecordingReader:
+    """Random access to a recording written by FrameRecorder.
+
+    `index` holds every frame's INDEX_DTYPE entry plus its segment number, in
+    recording order. Segments are memory-mapped, so raw frames are returned as
+    read-only views without copying. A torn tail (e.g. after a crash) is ignored.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._maps = []
+        indices = []
+        for segment, bin_path in enumerate(sorted(glob.glob(os.path.join(directory, "frames_*.bin")))):
+            data = np.memmap(bin_path, dtype=np.uint8, mode="r")
+            magic, version = _SEGMENT_STRUCT.unpack_from(data)
+            if magic != SEGMENT_MAGIC:
+                raise ValueError(f"{bin_path} is not a frame recording segment")
+            if version != HEADER_VERSION:
+                raise ValueError(f"{bin_path} uses frame header version {version} (expected {HEADER_VERSION})")
+            idx_path = bin_path[:-4] + ".idx"
+            raw = np.fromfile(idx_path, dtype=np.uint8)
+            entries = raw[:len(raw) - len(raw) % INDEX_DTYPE.itemsize].view(INDEX_DTYPE)
+            entries = entries[entries["payload_offset"] + entries["payload_bytes"] <= len(data)]
+            seg = np.empty(len(entries), dtype=[("segment", "<u4")] + [(n, INDEX_DTYPE[n]) for n in INDEX_DTYPE.names])
+            seg["segment"] = segment
+            for name in INDEX_DTYPE.names:
+                seg[name] = entries[name]
+            indices.append(seg)
+            self._maps.append(data)
+        if not indices:
+            raise FileNotFoundError(f"No recording segments in {directory}")
+        self.index = np.concatenate(indices)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def stream_name(self, i: int) -> str:
+        return STREAM_NAMES[int(self.index["stream"][i])]
+
+    def read(self, i: int) -> Tuple[FrameHeader, dict, np.ndarray]:
+        """Header, metadata and pixels of frame `i` (raw pixels are a read-only view into the file)."""
+        entry = self.index[i]
+        data = self._maps[entry["segment"]]
+        offset = int(entry["record_offset"])
+        header = FrameHeader.unpack(data[offset:offset + HEADER_SIZE])
+        (meta_len,) = _META_LEN.unpack_from(data, offset + HEADER_SIZE)
+        meta_start = offset + HEADER_SIZE + _META_LEN.size
+        meta = json.loads(bytes(data[meta_start:meta_start + meta_len]))
+        start = int(entry["payload_offset"])
+        payload = data[start:start + int(entry["payload_bytes"])]
+        return header, meta, payload_to_pixels(header, payload)
+
+    def __iter__(self) -> Iterator[Tuple[FrameHeader, dict, np.ndarray]]:
+        for i in range(len(self)):
+            yield self.read(i)
+
+    def close(self) -> None:
+        self._maps = []
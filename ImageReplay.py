@@ -0,0 +1,117 @@
+"""
+Replay a FrameRecorder recording through ImagePublisher, without the simulator.
+
+    python ImageReplay.py <recording dir> [--speed 1.0] [--transport multipart] [--loop]
+
+--speed 1 keeps the recorded SimClock timing, other values scale it, and 0
+publishes as fast as possible. Depth goes out in the recording's own format;
+compact formats (DepthFormat u16_mm / f16_cm) default to the multipart transport. Subscribers see the same headers (capture
+IDs, sim timestamps, projection matrices) as during the live run.
+"""
+import argparse
+import logging
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from ImagePublisher import CameraConfig, ChannelConfig, ImagePublisher
+from ImageRecording import RecordingReader
+from ImageTransport import DEPTH_FORMAT_NAMES, STREAM_IDS, TRANSPORT_MULTIPART, TRANSPORT_SINGLE, TRANSPORTS
+
+
+def replay(publisher: ImagePublisher, reader: RecordingReader, speed: float = 1.0,
+           streams: Optional[Sequence[str]] = None) -> int:
+    """Publish every frame of `reader` once, paced by its sim timestamps; returns frames sent."""
+    order = np.argsort(reader.index["sim_time_ns"], kind="stable")
+    if streams:
+        order = order[np.isin(reader.index["stream"][order], [STREAM_IDS[s] for s in streams])]
+    if not len(order):
+        return 0
+    sim_times = reader.index["sim_time_ns"][order]
+    t0_sim = int(sim_times[0])
+    t0_wall = time.perf_counter()
+    for i, sim_time_ns in zip(order, sim_times):
+        if speed > 0:
+            delay = t0_wall + (int(sim_time_ns) - t0_sim) / 1e9 / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        header, meta, pixels = reader.read(i)
+        projection = meta.get("projection")
+        if projection is not None:
+            projection = np.asarray(projection, dtype=np.float64)
+        pair_id = meta.get("pair_id", 0)
+        if header.stream == "RGB":
+            publisher.publish_RGB_frame(pixels, header.capture_id, header.sim_time_ns, projection, pair_id=pair_id)
+        else:
+            publisher.publish_Depth_frame(pixels, header.capture_id, header.sim_time_ns, projection, pair_id=pair_id)
+    return len(order)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Republish a recorded ImageSender session through ImagePublisher")
+    ap.add_argument("recording", help="Recording directory written by FrameRecorder")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=55556, help="RGB port (and depth port unless --depth-port)")
+    ap.add_argument("--depth-port", type=int, default=0, help="Separate depth channel port")
+    ap.add_argument("--transport", choices=TRANSPORTS,
+                    help="Default: single, or multipart for recordings with compact depth")
+    ap.add_argument("--rgb-codec", default="raw")
+    ap.add_argument("--depth-codec", default="raw")
+    ap.add_argument("--quality", type=int, default=-1)
+    ap.add_argument("--speed", type=float, default=1.0,
+                    help="1 = original timing, N = N times faster, 0 = as fast as possible")
+    ap.add_argument("--streams", nargs="+", choices=["RGB", "DEPTH"], help="Only replay these streams")
+    ap.add_argument("--loop", action="store_true", help="Replay until interrupted")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    # Opening only maps the files, so this is instant regardless of recording size
+    reader = RecordingReader(args.recording)
+    logging.info(f"{args.recording}: {len(reader)} frames")
+
+    # The first frame of each stream gives its resolution (to size the shm ring) and the depth format
+    first_frames = {}
+    for stream in ("RGB", "DEPTH"):
+        first = np.flatnonzero(reader.index["stream"] == STREAM_IDS[stream])
+        if len(first):
+            first_frames[stream] = reader.read(first[0])
+    depth_format = "f32_cm"
+    if "DEPTH" in first_frames:
+        dtype = first_frames["DEPTH"][2].dtype
+        if dtype not in DEPTH_FORMAT_NAMES:
+            ap.error(f"Recording has {dtype} depth, which is not one of the known depth formats")
+        depth_format = DEPTH_FORMAT_NAMES[dtype]
+    transport = args.transport or (TRANSPORT_SINGLE if depth_format == "f32_cm" else TRANSPORT_MULTIPART)
+    if depth_format != "f32_cm" and transport == TRANSPORT_SINGLE:
+        ap.error(f"Recording has {depth_format} depth, which needs --transport multipart or shm")
+
+    channels = {}
+    if args.depth_port:
+        channels = {"RGB": ChannelConfig(args.port), "DEPTH": ChannelConfig(args.depth_port)}
+    publisher = ImagePublisher(args.host, args.port, transport=transport,
+                               codecs={"RGB": args.rgb_codec, "DEPTH": args.depth_codec},
+                               quality=args.quality, channels=channels, depth_format=depth_format)
+    for stream, setup in (("RGB", publisher.setup_rgb_camera), ("DEPTH", publisher.setup_depth_camera)):
+        if stream in first_frames:
+            header = first_frames[stream][0]
+            setup(CameraConfig(width=header.width, height=header.height))
+    logging.info(f"Publishing over {transport}, depth as {depth_format}")
+
+    try:
+        while True:
+            start = time.perf_counter()
+            sent = replay(publisher, reader, args.speed, args.streams)
+            elapsed = time.perf_counter() - start
+            logging.info(f"Replayed {sent} frames in {elapsed:.2f}s ({sent / max(elapsed, 1e-9):.1f} FPS)")
+            if not args.loop:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.cleanup()
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,346 +13,174 @@ import numpy as np
 st.OnScreenLogMessage("ImageSender started properly.", "ImageSender", st.Severity.Info)
 
 import zmq
-import cv2
 import numpy as np
 
 import time
-from typing import Optional, Tuple, Dict
+import threading
+from collections import deque
+from typing import Optional, Tuple, Dict, Callable
 from dataclasses import dataclass
-import json
 from PIL import Image
 from typing import Any
 
+from ImagePublisher import CameraConfig, ChannelConfig, ImagePublisher, parse_stream_ports, parse_views
+from ImageRecording import FrameRecorder
+from PointCloud import DepthProjector
+from Scheduling import RateController, RateScheduler
+from SimTime import sim_time_to_ns
+from ImageTransport import (DEPTH_FORMATS, DEPTH_NODATA_MM, LOSSY_CODECS, TRANSPORT_SINGLE, FrameTrace, LatencyTracer,
+                            format_latency_report)
 
-#############################
-# Camera image publisher using ZMQ and OpenCV
-####################
-@dataclass
-class CameraConfig:
-    width: int = 640
-    height: int = 480
-
-DEBUG_IMG_FPS = 30.0
-
-
-def _wait_for_subscriber(pub_socket: zmq.Socket, timeout_s: float = 2.0) -> bool:
-    """
-    Robust, bounded wait for a TCP peer to connect to the PUB socket.
-    Uses a monitor + poller with a hard wall-clock timeout.
-    Returns True if we saw EVENT_ACCEPTED, else False after timeout.
-    Set env ST_ZMQ_NOWAIT=1 to skip waiting entirely.
-    """
-    try:
-        if os.getenv("ST_ZMQ_NOWAIT") == "1" or timeout_s <= 0:
-            return False
-
-        mon_addr = "inproc://pub_mon"
-        # Listen for ACCEPTED (peer connected) plus a few harmless extras
-        pub_socket.monitor(mon_addr,
-                           zmq.EVENT_ACCEPTED | zmq.EVENT_LISTENING | zmq.EVENT_CONNECT_DELAYED)
-        mon = pub_socket.get_monitor_socket()
-
-        # Use a poller instead of relying solely on RCVTIMEO
-        poller = zmq.Poller()
-        poller.register(mon, zmq.POLLIN)
-
-        deadline = time.time() + timeout_s
-        accepted = False
-
-        while time.time() < deadline:
-            # Poll in short slices so KeyboardInterrupt is responsive
-            remaining_ms = max(1, int((deadline - time.time()) * 1000))
-            events = dict(poller.poll(min(remaining_ms, 100)))
-            if events.get(mon) == zmq.POLLIN:
-                try:
-                    frames = mon.recv_multipart(zmq.NOBLOCK)
-                except zmq.Again:
-                    continue
-                if not frames:
-                    continue
-                # First frame encodes event id and value; event id is the first 2 bytes (uint16 LE)
-                raw = frames[0]
-                if len(raw) >= 2:
-                    event_id = int.from_bytes(raw[:2], "little")
-                    if event_id == zmq.EVENT_ACCEPTED:
-                        accepted = True
-                        break
-            # loop until deadline
-
-        return accepted
-
-    except Exception as e:
-        # If anything goes weird with monitors, just don't block startup
-        try:
-            st.logger_warn(f"_wait_for_subscriber: monitor fallback due to: {e}")
-        except Exception:
-            pass
-        return False
-    finally:
-        # Clean up the monitor if it was enabled
-        try:
-            mon.close(0)
-        except Exception:
-            pass
-        try:
-            pub_socket.disable_monitor()
-        except Exception:
-            pass
-
-
-class ImagePublisher:
-    def __init__(self, host: str = "0.0.0.0", port: int = 55556):
-        """Initialize the image publisher with configurable host and port.
 
-        Args:
-            host (str): Host address to bind to
-            port (int): Port number to use
-        """
-        self.context = zmq.Context()
-        self.socket = self._setup_socket(host, port)
-        
-        # Store camera configurations
-        self.rgb_config = None
-        self.depth_config = None
-        
-        # Timing and stats
-        self.last_time = time.time()
-        self.frames_count = 0
-        self.frame_count = 0  # Used for generating dynamic patterns
-
-    def _setup_socket(self, host: str, port: int) -> zmq.Socket:
-        """Setup and configure the ZMQ socket with optimal settings."""
-        self.context.setsockopt(zmq.MAX_SOCKETS, 1)
-        socket_ = self.context.socket(zmq.PUB)
-
-        # Configure socket for high-throughput streaming
-        socket_.setsockopt(zmq.SNDHWM, 2)   # small HWM + CONFLATE => latest only
-        socket_.setsockopt(zmq.RCVHWM, 2)
-        socket_.setsockopt(zmq.LINGER, 0)
-        socket_.setsockopt(zmq.CONFLATE, 1)  # Only keep latest message
-        socket_.setsockopt(zmq.SNDBUF, 2*1024*1024)
-        socket_.setsockopt(zmq.TCP_KEEPALIVE, 1)
-        socket_.setsockopt(zmq.TCP_KEEPALIVE_IDLE, 120)
-        socket_.setsockopt(zmq.IMMEDIATE, 1)  # don't queue if no peer
-
-        endpoint = f"tcp://{host}:{port}"
-        socket_.bind(endpoint)
-        st.logger_info(f"Publisher bound to {endpoint}")
-
-        # ---> Key addition: wait briefly for a TCP accept, then small grace
-        # if _wait_for_subscriber(socket_, timeout_s=2.0):
-        #     st.logger_info("Subscriber connected (TCP). Waiting 200ms for SUBSCRIBE to apply...")
-        #     time.sleep(0.2)
-        # else:
-        #     st.logger_info("No subscriber detected within timeout; publishing anyway (early msgs may be dropped).")
-
-        return socket_
-
-
-    def setup_rgb_camera(self, config: CameraConfig = CameraConfig()) -> bool:
-        """Setup RGB camera configuration.
-
-        Args:
-            config (CameraConfig): Camera configuration parameters
-
-        Returns:
-            bool: True if setup was successful
-        """
-        self.rgb_config = config
-        st.logger_info(f"RGB camera configured for {config.width}x{config.height} @ {DEBUG_IMG_FPS} DEBUG_IMG_FPS")
-        return True
-
-    def setup_depth_camera(self, config: CameraConfig = CameraConfig()) -> bool:
-        """Setup depth camera configuration.
+################################################################
 
-        Args:
-            config (CameraConfig): Camera configuration parameters
 
-        Returns:
-            bool: True if setup was successful
-        """
-        self.depth_config = config
-        st.logger_info(f"Depth camera configured for {config.width}x{config.height} @ {DEBUG_IMG_FPS} DEBUG_IMG_FPS")
-        return True
+class FramePool:
+    """Reusable frame buffers keyed by (shape, dtype).
 
-    def _generate_rgb_frame(self) -> np.ndarray:
-        """Generate a dummy RGB frame with a moving pattern."""
-        if not self.rgb_config:
-            return None
-            
-        # Create a moving color pattern
-        x = np.linspace(0, 2*np.pi, self.rgb_config.width)
-        y = np.linspace(0, 2*np.pi, self.rgb_config.height)
-        X, Y = np.meshgrid(x, y)
-        
-        # Create moving waves for each color channel
-        t = self.frame_count * 0.1
-        r = np.sin(X + t) * 128 + 128
-        g = np.sin(Y - t) * 128 + 128
-        b = np.sin(X + Y + t) * 128 + 128
-        
-        # Combine channels and ensure uint8 format
-        frame = np.stack([b, g, r], axis=2).astype(np.uint8)
-        return frame
-
-    def _generate_depth_frame(self) -> np.ndarray:
-        """Generate a dummy depth frame with a moving pattern."""
-        if not self.depth_config:
-            return None
-            
-        # Create a moving depth pattern (single channel)
-        x = np.linspace(0, 2*np.pi, self.depth_config.width)
-        y = np.linspace(0, 2*np.pi, self.depth_config.height)
-        X, Y = np.meshgrid(x, y)
-        
-        t = self.frame_count * 0.05
-        # Create a circular wave pattern
-        center_x = self.depth_config.width / 2
-        center_y = self.depth_config.height / 2
-        R = np.sqrt((X - center_x)**2 + (Y - center_y)**2)
-        depth = (np.sin(R * 0.1 - t) * 128 + 128).astype(np.uint8)
-        
-        # Convert to 3-channel format (all channels identical for grayscale)
-        frame = np.stack([depth, depth, depth], axis=2)
-        return frame
-
-    def _send_frame(self, frame: np.ndarray, frame_type: str) -> None:
-        """Send a frame with header indicating frame type and dimensions."""
-        try:
-            frame_time = time.time()
-            # Convert frame to contiguous array for faster tobytes()
-            if not frame.flags['C_CONTIGUOUS']:
-                frame = np.ascontiguousarray(frame)
-            img_data = frame.tobytes()
-            
-            header = "ERROR_HEADER"
-            if frame_type == "RGB":
-                # Header format: TYPE#HEIGHT#WIDTH#CHANNELS#
-                header = f"{frame_type}#{frame.shape[0]:04d}#{frame.shape[1]:04d}#{frame.shape[2]:04d}#"
-            elif frame_type == "DEPTH":
-                header = f"{frame_type}#{frame.shape[0]:04d}#{frame.shape[1]:04d}#1#"
+    Buffers handed to a zero-copy send come back with the ZMQ tracker of that
+    send and are only reused once ZMQ has let go of them, so in steady state
+    no frame buffers are allocated.
+    """
+    def __init__(self, max_free_per_key: int = 4):
+        self.max_free_per_key = max_free_per_key
+        self.allocations = 0
+        self._free: Dict[Tuple[Tuple[int, ...], np.dtype], list] = {}
+        self._pending: list = []  # (tracker, buffer) still referenced by ZMQ
+        self._lock = threading.Lock()
+
+    def acquire(self, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        key = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            self._reclaim()
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+            self.allocations += 1
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buf: np.ndarray, tracker: Optional[zmq.MessageTracker] = None) -> None:
+        """Return `buf` to the pool, deferred until `tracker` is done if one is given."""
+        with self._lock:
+            if tracker is not None and not tracker.done:
+                self._pending.append((tracker, buf))
             else:
-                st.logger_error(f"Unknown frame type: {frame_type}")
-                raise Exception(f"Unknown frame type: {frame_type}")
-            
-            message = header.encode('ascii') + img_data
-            
-            # Send as a single message
-            self.socket.send(message, flags=zmq.NOBLOCK)
-            # st.logger_info(f"Sent {frame_type} frame of size {len(message)} bytes")
-            
-            # Update statistics
-            self.frames_count += 1
-            current_time = time.time()
-            if current_time - self.last_time > 1.0:
-                fps = self.frames_count / (current_time - self.last_time)
-                encode_time = (time.time() - frame_time) * 1000
-                st.logger_info(f"{frame_type}: {fps:.1f} FPS, Encode+Send: {encode_time:.1f}ms")
-                self.frames_count = 0
-                self.last_time = current_time
-                
-        except zmq.Again:
-            st.logger_warn(f"Send buffer full, skipping {frame_type} frame")
-
-    def publish_RGB_frame(self, frame: np.ndarray) -> None:
-        """Publish a single RGB frame."""
-        self._send_frame(frame, "RGB")
-
-    
-    def publish_Depth_frame(self, frame: np.ndarray) -> None:
-        """Publish a single Depth frame."""
-        self._send_frame(frame, "DEPTH")
-
-    # Debug function to publish test frames
-    def publish_test_frames(self) -> None:
-        """Publish frames from simulated cameras."""
-        try:
-            target_interval = 1.0 / DEBUG_IMG_FPS
-            next_frame_time = time.time()
-            
-            while True:
-                current_time = time.time()
-                if current_time < next_frame_time:
-                    # Use a shorter sleep to be more responsive
-                    time.sleep(min(0.001, next_frame_time - current_time))
-                    continue
-                
-                self.frame_count += 1
-                
-                # Pre-generate frames to reduce latency between sends
-                rgb_frame = self._generate_rgb_frame() if self.rgb_config else None
-                depth_frame = self._generate_depth_frame() if self.depth_config else None
-                
-                # Send frames as close together as possible
-                if rgb_frame is not None:
-                    self._send_frame(rgb_frame, "RGB")
-                if depth_frame is not None:
-                    self._send_frame(depth_frame, "DEPTH")
-                
-                # Calculate next frame time based on target rate
-                next_frame_time = current_time + target_interval
-
-        except KeyboardInterrupt:
-            st.logger_info("Shutting down...")
-        finally:
-            self.cleanup()
-
-    def cleanup(self) -> None:
-        """Release resources and close connections."""
-        self.socket.close()
-        self.context.term()
-
-# if __name__ == "__main__":
-#     # Example usage
-#     publisher = ImagePublisher()
-    
-#     # Configure RGB camera with custom settings
-#     rgb_config = CameraConfig(
-#         width=640,
-#         height=480,
-#         camera_id=0,
-#         fourcc='MJPG'
-#     )
-#     publisher.setup_rgb_camera(rgb_config)
-    
-#     # Configure depth camera with custom settings
-#     depth_config = CameraConfig(
-#         width=640,
-#         height=480,
-#         fps=60,  # Lower FPS for depth is typical
-#         camera_id=1,
-#         fourcc='MJPG'
-#     )
-#     publisher.setup_depth_camera(depth_config)
-
-    
-#     # Start publishing frames
-#     publisher.publish_test_frames()
-################################################################
+                self._put(buf)
+
+    def _reclaim(self) -> None:
+        if not self._pending:
+            return
+        still_pending = []
+        for tracker, buf in self._pending:
+            if tracker.done:
+                self._put(buf)
+            else:
+                still_pending.append((tracker, buf))
+        self._pending = still_pending
+
+    def _put(self, buf: np.ndarray) -> None:
+        free = self._free.setdefault((buf.shape, buf.dtype), [])
+        if len(free) < self.max_free_per_key:
+            free.append(buf)
 
 
+class DepthNoise:
+    """Persistent, seedable Gaussian noise source for depth frames.
 
-def image_RGB_to_ndarray(imageR: list[float], imageG: list[float], imageB: list[float], resolutionX: int, resolutionY: int):
-    # Interleave RGB data
-    rgb_array = np.zeros((resolutionY, resolutionX, 3), dtype=np.uint8)
-    rgb_array[:, :, 0] = np.array(imageR, dtype=np.uint8).reshape((resolutionY, resolutionX))
-    rgb_array[:, :, 1] = np.array(imageG, dtype=np.uint8).reshape((resolutionY, resolutionX))
-    rgb_array[:, :, 2] = np.array(imageB, dtype=np.uint8).reshape((resolutionY, resolutionX))
-    return rgb_array
+    Modes:
+        "exact": fresh float32 normals for every pixel of every frame
+        "tiled": adds a window of a precomputed noise bank (twice the frame size
+            in each axis) at a random per-frame offset; much cheaper, but
+            consecutive frames share shifted noise patterns
+    """
+    MODES = ("exact", "tiled")
+
+    def __init__(self, sigma_cm: float = 0.3, seed: Optional[int] = None, mode: str = "exact",
+                 rng: Optional[np.random.Generator] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown depth noise mode '{mode}', expected one of {self.MODES}")
+        self.sigma_cm = sigma_cm
+        self.mode = mode
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+        self._banks: Dict[Tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()  # Generators are not safe to share between convert workers
+
+    def _bank(self, shape: Tuple[int, int]) -> np.ndarray:
+        bank = self._banks.get(shape)
+        if bank is None:
+            bank = self.rng.standard_normal((2 * shape[0], 2 * shape[1]), dtype=np.float32)
+            np.multiply(bank, self.sigma_cm, out=bank)
+            self._banks[shape] = bank
+        return bank
+
+    def add(self, arr: np.ndarray, pool: Optional["FramePool"] = None) -> None:
+        """Add noise to the HxW float32 `arr` in place."""
+        h, w = arr.shape
+        if self.mode == "tiled":
+            with self._lock:
+                bank = self._bank((h, w))
+                oy = int(self.rng.integers(0, h + 1))
+                ox = int(self.rng.integers(0, w + 1))
+            np.add(arr, bank[oy:oy + h, ox:ox + w], out=arr)
+            return
+
+        noise = pool.acquire(arr.shape, np.float32) if pool is not None else np.empty(arr.shape, dtype=np.float32)
+        with self._lock:
+            self.rng.standard_normal(dtype=np.float32, out=noise)
+        np.multiply(noise, self.sigma_cm, out=noise)
+        np.add(arr, noise, out=arr)
+        if pool is not None:
+            pool.release(noise)
+
+
+# Used when image_Depth_to_ndarray isn't given a noise source
+_default_depth_noise = DepthNoise()
+
+
+def image_RGB_to_ndarray(imageR: list[float], imageG: list[float], imageB: list[float], resolutionX: int, resolutionY: int,
+                         out: Optional[np.ndarray] = None) -> np.ndarray:
+    # Interleave RGB data straight into the (optionally pooled) output; no zero-fill needed
+    # since every channel is overwritten. Buffer inputs are read in place, Python lists
+    # still need one transient uint8 plane each.
+    if out is None:
+        out = np.empty((resolutionY, resolutionX, 3), dtype=np.uint8)
+    out[:, :, 0] = np.asarray(imageR, dtype=np.uint8).reshape((resolutionY, resolutionX))
+    out[:, :, 1] = np.asarray(imageG, dtype=np.uint8).reshape((resolutionY, resolutionX))
+    out[:, :, 2] = np.asarray(imageB, dtype=np.uint8).reshape((resolutionY, resolutionX))
+    return out
+
+DEPTH_SATURATION = ("clip", "nodata")
 
 def image_Depth_to_ndarray(
     pixels: Any, resolutionX: int, resolutionY: int,
-    *, max_cm: float = 20_000.0, nodata: float = 9_999_999.0, rng: np.random.Generator | None = None
+    *, max_cm: float = 20_000.0, nodata: float = 9_999_999.0, rng: np.random.Generator | None = None,
+    out: Optional[np.ndarray] = None, pool: Optional[FramePool] = None, noise: Optional[DepthNoise] = None,
+    depth_format: str = "f32_cm", saturation: str = "clip"
     ) -> np.ndarray:
-
+    """Convert a depth capture to `depth_format` with sensor noise and nodata marking.
+
+    With `out` the result is written into that HxW buffer (of the format's dtype)
+    instead of a new (or the input's) array; with `pool` the noise, mask and
+    float32 working buffers are borrowed from it, so a pooled call allocates
+    nothing for buffer inputs. `noise` is the persistent noise source to draw
+    from (`rng` is only used when it isn't given).
+
+    Formats (see ImageTransport.DEPTH_FORMATS): "f32_cm" marks nodata with
+    `nodata`, "f16_cm" with +inf and "u16_mm" with DEPTH_NODATA_MM. u16_mm tops
+    out at 65.534 m; `saturation` decides whether valid ranges beyond that
+    "clip" to it or become "nodata".
+    """
+    if depth_format not in DEPTH_FORMATS:
+        raise ValueError(f"Unknown depth format '{depth_format}', expected one of {tuple(DEPTH_FORMATS)}")
+    if saturation not in DEPTH_SATURATION:
+        raise ValueError(f"Unknown saturation policy '{saturation}', expected one of {DEPTH_SATURATION}")
+    dtype, units = DEPTH_FORMATS[depth_format]
     count = resolutionX * resolutionY
+    shape = (resolutionY, resolutionX)
 
     # Fast path for buffer-like inputs (bytes/bytearray/memoryview/NumPy array)
     if isinstance(pixels, (bytes, bytearray, memoryview)):
         arr = np.frombuffer(pixels, dtype=np.float32, count=count)
-        # bytes -> often read-only; make writable if needed
-        if not arr.flags.writeable:
-            arr = arr.copy()
     elif isinstance(pixels, np.ndarray) and pixels.dtype == np.float32 and pixels.size == count:
         # Zero-copy reshape if already a flat float32 array
         arr = pixels
@@ -364,23 +192,326 @@ def image_Depth_to_ndarray(
     if arr.size != count:
         raise ValueError(f"Depth buffer size {arr.size} != {count} (X={resolutionX}, Y={resolutionY})")
 
-    # Make sure it's contiguous & writable for in-place ops
-    if not (arr.flags.c_contiguous and arr.flags.writeable):
-        arr = np.ascontiguousarray(arr)
+    # Compact formats are computed in a float32 working buffer, then cast once into `out`
+    compact_out = None
+    if depth_format != "f32_cm":
+        compact_out = out if out is not None else np.empty(shape, dtype=dtype)
+        out = pool.acquire(shape, np.float32) if pool is not None else None
 
-    arr = arr.reshape((resolutionY, resolutionX))
+    if out is not None:
+        np.copyto(out, arr.reshape(shape))
+        arr = out
+    else:
+        # Make sure it's contiguous & writable for in-place ops
+        if not (arr.flags.c_contiguous and arr.flags.writeable):
+            arr = np.array(arr, dtype=np.float32)
+        arr = arr.reshape(shape)
 
     # Add ±0.3 cm Gaussian noise, in-place
-    if rng is None:
-        rng = np.random.default_rng()
-    noise = rng.normal(0.0, 0.3, arr.shape).astype(np.float32)
-    np.add(arr, noise, out=arr)
+    if noise is None:
+        noise = DepthNoise(rng=rng) if rng is not None else _default_depth_noise
+    noise.add(arr, pool)
 
     # Mark values beyond max range as nodata (one pass)
-    arr[arr > max_cm] = nodata
-
+    mask = pool.acquire(shape, np.bool_) if pool is not None else np.empty(shape, dtype=np.bool_)
+    if units == "mm" and saturation == "nodata":
+        np.greater(arr, min(max_cm, (DEPTH_NODATA_MM - 1) / 10.0), out=mask)
+    else:
+        np.greater(arr, max_cm, out=mask)
+
+    if compact_out is None:
+        np.copyto(arr, nodata, where=mask)
+    elif units == "mm":
+        # Clip into [0, 65534] mm and round by +0.5 ahead of the truncating cast
+        np.multiply(arr, 10.0, out=arr)
+        np.clip(arr, 0.0, DEPTH_NODATA_MM - 1, out=arr)
+        np.add(arr, 0.5, out=arr)
+        np.copyto(compact_out, arr, casting="unsafe")
+        np.copyto(compact_out, DEPTH_NODATA_MM, where=mask)
+    else:
+        np.copyto(compact_out, arr, casting="same_kind")
+        np.copyto(compact_out, np.inf, where=mask)
+
+    if pool is not None:
+        pool.release(mask)
+    if compact_out is not None:
+        if pool is not None:
+            pool.release(arr)
+        return compact_out
     return arr
 
+#######################################
+# Off-callback frame pipeline
+#######################################
+class LatestQueue:
+    """Bounded hand-off queue that keeps the newest items.
+
+    Items are keyed by stream and each stream holds at most `depth` of them;
+    putting into a full stream evicts its oldest item and counts it as dropped,
+    so a slow consumer never builds up latency and one stream never evicts another.
+    """
+    def __init__(self, name: str, depth: int = 1, on_drop: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.depth = depth
+        self.on_drop = on_drop
+        self.dropped: Dict[str, int] = {}
+        self.closed = False
+        self._slots: Dict[str, deque] = {}
+        self._order: deque = deque()  # stream keys in arrival order, one per queued item
+        self._cond = threading.Condition()
+
+    def put(self, key: str, item: Any) -> None:
+        with self._cond:
+            slot = self._slots.setdefault(key, deque())
+            evicted = None
+            if len(slot) >= self.depth:
+                evicted = slot.popleft()
+                self._order.remove(key)  # oldest entry of this key
+                self.dropped[key] = self.dropped.get(key, 0) + 1
+            slot.append(item)
+            self._order.append(key)
+            self._cond.notify()
+        if evicted is not None and self.on_drop is not None:
+            self.on_drop(evicted)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[str, Any]]:
+        """Pop the oldest queued (key, item); None on timeout or once closed."""
+        with self._cond:
+            if not self._order and not self.closed:
+                self._cond.wait(timeout)
+            if not self._order:
+                return None
+            key = self._order.popleft()
+            return key, self._slots[key].popleft()
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class FramePipeline:
+    """Runs conversion, noise, encoding and sending off the simulator's image callback.
+
+    callback -> [convert queue] -> convert worker(s) -> [send queue] -> send thread
+
+    The send stage is a single thread because ZMQ sockets are not thread safe.
+    """
+    def __init__(self, convert: Callable[[Any], np.ndarray], send: Callable[[Any, np.ndarray], None],
+                 discard: Optional[Callable[[Any, np.ndarray], None]] = None,
+                 num_workers: int = 1, depth: int = 1, stats_period_s: float = 5.0):
+        """
+        Args:
+            convert: capture -> frame, run on the convert workers
+            send: (capture, frame) -> None, run on the send thread
+            discard: (capture, frame) -> None for converted frames that are dropped unsent
+        """
+        self.convert = convert
+        self.send = send
+        self.discard = discard
+        self.convert_queue = LatestQueue("convert", depth)
+        self.send_queue = LatestQueue("send", depth, on_drop=self._on_send_drop)
+        self.stats_period_s = stats_period_s
+        self._last_stats_time = time.perf_counter()
+        self._last_dropped = {"convert": {}, "send": {}}
+
+        self._threads = [threading.Thread(target=self._convert_loop, name=f"ImageConvert{i}", daemon=True)
+                         for i in range(max(1, num_workers))]
+        self._threads.append(threading.Thread(target=self._send_loop, name="ImageSend", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def _on_send_drop(self, entry: Tuple[Any, np.ndarray]) -> None:
+        if self.discard is not None:
+            self.discard(*entry)
+
+    def submit(self, stream: str, item: Any) -> None:
+        """Hand a capture to the pipeline; never blocks."""
+        self.convert_queue.put(stream, item)
+
+    def _convert_loop(self) -> None:
+        while True:
+            entry = self.convert_queue.get()
+            if entry is None:
+                if self.convert_queue.closed:
+                    return
+                continue
+            stream, item = entry
+            try:
+                frame = self.convert(item)
+            except Exception as e:
+                st.logger_error(f"{stream} frame conversion failed: {e}")
+                continue
+            self.send_queue.put(stream, (item, frame))
+
+    def _send_loop(self) -> None:
+        while True:
+            entry = self.send_queue.get(timeout=self.stats_period_s)
+            self._maybe_log_stats()
+            if entry is None:
+                if self.send_queue.closed:
+                    return
+                continue
+            stream, (item, frame) = entry
+            try:
+                self.send(item, frame)
+            except Exception as e:
+                st.logger_error(f"{stream} frame send failed: {e}")
+
+    def _maybe_log_stats(self) -> None:
+        now = time.perf_counter()
+        if now - self._last_stats_time < self.stats_period_s:
+            return
+        self._last_stats_time = now
+        dropped = {q.name: dict(q.dropped) for q in (self.convert_queue, self.send_queue)}
+        if dropped != self._last_dropped:
+            st.logger_info(f"Pipeline drops (total) convert: {dropped['convert']}, send: {dropped['send']}")
+            self._last_dropped = dropped
+
+    def close(self) -> None:
+        self.convert_queue.close()
+        self.send_queue.close()
+        for t in self._threads:
+            t.join(timeout=1.0)
+
+
+#######################################
+# Capture scheduling
+#######################################
+# Per-stream deadlines live in Scheduling.RateScheduler, shared with ROS_Telemetry
+class CaptureManager:
+    """Tracks in-flight st.camera.CaptureImage requests and applies backpressure.
+
+    At most `max_in_flight` captures per stream may be outstanding; ticks beyond that
+    are skipped so a slow renderer can't build an unbounded backlog. Requests with no
+    callback after `timeout_s` are written off as lost. Request-to-callback latency
+    is logged every `report_period_s`. Callbacks may arrive on another thread.
+    """
+    def __init__(self, max_in_flight: int = 2, timeout_s: float = 1.0, report_period_s: float = 5.0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout_s = timeout_s
+        self.report_period_s = report_period_s
+        self.in_flight: Dict[str, Dict[int, float]] = {}  # stream -> capture ID -> request time
+        self.skipped: Dict[str, int] = {}
+        self.timed_out: Dict[str, int] = {}
+        self.late = 0  # callbacks for captures already written off
+        self._latencies: Dict[str, list] = {}
+        self._last_report = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _expire(self, stream: str, now: float) -> None:
+        pending = self.in_flight.setdefault(stream, {})
+        for cid in [c for c, t in pending.items() if now - t > self.timeout_s]:
+            del pending[cid]
+            self.timed_out[stream] = self.timed_out.get(stream, 0) + 1
+
+    def try_acquire(self, stream: str) -> bool:
+        """Whether a new capture may be requested for `stream` now; counts a skip if not."""
+        now = time.perf_counter()
+        with self._lock:
+            self._expire(stream, now)
+            if len(self.in_flight[stream]) < self.max_in_flight:
+                return True
+            self.skipped[stream] = self.skipped.get(stream, 0) + 1
+            return False
+
+    def requested(self, stream: str, capture_id: int) -> None:
+        with self._lock:
+            self.in_flight.setdefault(stream, {})[capture_id] = time.perf_counter()
+
+    def completed(self, capture_id: int) -> Optional[float]:
+        """Mark a capture's callback as arrived; returns its perf_counter() request time, or None if unknown."""
+        now = time.perf_counter()
+        with self._lock:
+            for stream, pending in self.in_flight.items():
+                requested_at = pending.pop(capture_id, None)
+                if requested_at is not None:
+                    self._latencies.setdefault(stream, []).append(now - requested_at)
+                    return requested_at
+            self.late += 1
+            return None
+
+    def maybe_report(self) -> None:
+        now = time.perf_counter()
+        if now - self._last_report < self.report_period_s:
+            return
+        self._last_report = now
+        with self._lock:
+            latencies, self._latencies = self._latencies, {}
+            parts = []
+            for stream, pending in self.in_flight.items():
+                lat = np.array(latencies.get(stream, [])) * 1000
+                lat_str = f"latency p50 {np.median(lat):.1f}ms max {lat.max():.1f}ms" if lat.size else "no callbacks"
+                parts.append(f"{stream}: {lat_str}, in flight {len(pending)}, "
+                             f"skipped {self.skipped.get(stream, 0)}, timed out {self.timed_out.get(stream, 0)}")
+        st.logger_info("Captures " + "; ".join(parts) + (f"; late {self.late}" if self.late else ""))
+
+
+class CapturePairer:
+    """Holds the RGB and depth halves of paired captures until both callbacks are in.
+
+    `add` registers an RGB and a depth capture requested on the same tick. `offer`
+    returns a paired capture's frame only once its partner has arrived too; both then
+    carry the same `pair_id` and the earlier of their `sim_time_ns` stamps. A pair
+    that isn't complete `timeout_s` after it was requested is given up on by `expire`:
+    a half already held is returned with pair ID 0, and a late half goes out unpaired.
+    Frames are anything with `pair_id` and `sim_time_ns` attributes. Callbacks may
+    arrive on another thread.
+    """
+    def __init__(self, timeout_s: float = 1.0):
+        self.timeout_s = timeout_s
+        self.paired = 0
+        self.timed_out = 0
+        self._next_pair_id = 0
+        self._pairs: Dict[int, list] = {}  # pair ID -> [capture IDs, deadline, held frame or None]
+        self._pair_of: Dict[int, int] = {}  # capture ID -> pair ID
+        self._lock = threading.Lock()
+
+    def add(self, rgb_id: int, depth_id: int) -> int:
+        with self._lock:
+            self._next_pair_id = self._next_pair_id % 0xFFFFFFFF + 1  # fits the header's uint32, never 0
+            pair_id = self._next_pair_id
+            self._pairs[pair_id] = [(rgb_id, depth_id), time.perf_counter() + self.timeout_s, None]
+            self._pair_of[rgb_id] = self._pair_of[depth_id] = pair_id
+        return pair_id
+
+    def offer(self, capture_id: int, frame: Any) -> list:
+        """Frames that are ready to publish now that `frame` (from `capture_id`) has arrived."""
+        with self._lock:
+            pair_id = self._pair_of.pop(capture_id, None)
+            if pair_id is None:
+                return [frame]  # not paired, or its pair already expired
+            pair = self._pairs[pair_id]
+            held = pair[2]
+            if held is None:
+                pair[2] = frame
+                return []
+            del self._pairs[pair_id]
+            self.paired += 1
+        stamp = min(held.sim_time_ns, frame.sim_time_ns)
+        for f in (held, frame):
+            f.pair_id = pair_id
+            f.sim_time_ns = stamp
+        return [held, frame]
+
+    def expire(self) -> list:
+        """Give up on pairs past their deadline; returns the halves that were held for them."""
+        now = time.perf_counter()
+        released = []
+        with self._lock:
+            for pair_id in [p for p, pair in self._pairs.items() if now > pair[1]]:
+                capture_ids, _, held = self._pairs.pop(pair_id)
+                for capture_id in capture_ids:
+                    self._pair_of.pop(capture_id, None)
+                if held is not None:
+                    released.append(held)
+                self.timed_out += 1
+        return released
+
+
 #######################################
 # BEGIN MAIN SCRIPT
 #######################################
@@ -432,80 +563,184 @@ def capture_image_depth(camera: st.Entity):
     id = st.camera.CaptureImage(camera, properties)
     return id
 
-#UNUSED IN THIS SCRIPT BY DEFAULT
-def ProcessImage_Save_RGB(image : st.camera.CapturedImage):
-    capID = image.properties.CaptureID
-    resx = image.properties.ResolutionX
-    resy = image.properties.ResolutionY
-    projectionMat = image.properties.ProjectionMatrix
-    # st.logger_info("Projection Matrix: " + str(projectionMat))
-
-    timestamp = image.get_timestamp().as_tai_string()
-
-    # st.logger_info("Image resolution: [" + str(resx) + ", " + str(resy) + "]")
-    img_r = np.array(image.as_RGB8().PixelsR, dtype=np.uint8).reshape((resy, resx))
-    img_g = np.array(image.as_RGB8().PixelsG, dtype=np.uint8).reshape((resy, resx))
-    img_b = np.array(image.as_RGB8().PixelsB, dtype=np.uint8).reshape((resy, resx))
-
-    # Stack channels into a single 3D array (height x width x 3)
-
-    output_filename = f"{output_full_filepath}/image_{capID:07d}"
-
-    # OpenCV uses BGR ordering
-    img_bgr = np.stack((img_b, img_g, img_r), axis=-1)
-    cv2.imwrite(output_filename + ".jpg", img_bgr)
-
-    metadata = { "Timestamp": timestamp }
-    json.dump(metadata, open(output_filename + ".json", "w"))
-    # st.OnScreenLogMessage(f"Saved Image {capID}", "CamTest", st.Severity.Info)
-
-#UNUSED IN THIS SCRIPT BY DEFAULT
-def ProcessImage_Save_Depth(image : st.camera.CapturedImage_f32):
-    capID = image.properties.CaptureID
-    resx = image.properties.ResolutionX
-    resy = image.properties.ResolutionY
-    projectionMat = image.properties.ProjectionMatrix
-    # st.logger_info("Projection Matrix: " + str(projectionMat))
-
-    timestamp = image.get_timestamp().as_tai_string()
-
-    # st.logger_info("Image resolution: [" + str(resx) + ", " + str(resy) + "]")
-    img = np.array(image.as_f32().Pixels, dtype=np.float32).reshape((resy, resx))
-
-    output_filename = f"{output_full_filepath}/depth_{capID:07d}"
-
-    # OpenCV saving
-    cv2.imwrite(output_filename + ".tif", img)
+@dataclass
+class CameraOutput:
+    """A camera entity, the streams captured from it and the publisher they go out on."""
+    name: str  # "" for the primary camera, which keeps the plain stream keys
+    entity: st.Entity
+    publisher: ImagePublisher
+    streams: Tuple[str, ...]  # published streams: "RGB", "DEPTH" and/or "POINTS" (from DEPTH)
 
-    # Output JSON metadata
-    metadata = { "Timestamp": timestamp }
-    json.dump(metadata, open(output_filename + ".json", "w"))
-    # st.OnScreenLogMessage(f"Saved Image {capID}", "CamTest", st.Severity.Info)
+    def key(self, stream: str) -> str:
+        """Key of one of this camera's streams in the scheduler, pipeline queues and stats."""
+        return f"{self.name}/{stream}" if self.name else stream
 
 
-def imageReceived(capturedImage: st.camera.CapturedImage):
+@dataclass
+class CapturedFrame:
+    """What the image callback hands to the pipeline: the typed capture plus its metadata."""
+    camera: CameraOutput
+    stream: str
+    image: Any  # st.camera.CapturedImage_RGB8 or st.camera.CapturedImage_f32
+    capture_id: int
+    resx: int
+    resy: int
+    sim_time_ns: int
+    projection: Any
+    trace: FrameTrace
+    fov: Optional[float] = None
+    pair_id: int = 0  # shared with the other half of a paired RGB-D capture (see CapturePairer)
+    points: Optional[np.ndarray] = None  # Nx3 XYZ (m) from a depth frame when PointCloud is on
+
+
+def convert_frame(captured: CapturedFrame) -> np.ndarray:
+    """Turn a capture into the ndarray that gets published (conversion + noise)."""
+    img = captured.image
+    if captured.stream == "RGB":
+        out = frame_pool.acquire((captured.resy, captured.resx, 3), np.uint8)
+        frame = image_RGB_to_ndarray(img.PixelsR, img.PixelsG, img.PixelsB, captured.resx, captured.resy, out=out)
+    else:
+        out = frame_pool.acquire((captured.resy, captured.resx), DEPTH_FORMATS[depth_format][0])
+        frame = image_Depth_to_ndarray(img.Pixels, captured.resx, captured.resy, out=out, pool=frame_pool,
+                                       noise=depth_noise, depth_format=depth_format, saturation=depth_saturation)
+        if "POINTS" in captured.camera.streams:
+            try:
+                captured.points = projector.project(frame, captured.projection, captured.fov)
+            except Exception as e:
+                # The depth frame is fine; publish it without points rather than lose it too
+                captured.points = None
+                key = captured.camera.key("POINTS")
+                if key not in projection_failed:
+                    projection_failed.add(key)
+                    st.logger_error(f"{key} projection failed, publishing depth without points: {e}")
+    captured.trace.mark("converted")
+    return frame
+
+
+def publish_frame(captured: CapturedFrame, frame: np.ndarray) -> None:
+    """Encode and send a converted frame, then give its buffer back to the pool."""
+    publisher = captured.camera.publisher
+    if captured.stream == "RGB":
+        tracker = publisher.publish_RGB_frame(frame, captured.capture_id, captured.sim_time_ns, captured.projection,
+                                              captured.trace, captured.pair_id)
+    else:
+        tracker = publisher.publish_Depth_frame(frame, captured.capture_id, captured.sim_time_ns, captured.projection,
+                                                captured.trace, captured.pair_id)
+        if captured.points is not None:
+            publisher.publish_PointCloud(captured.points, captured.capture_id, captured.sim_time_ns, captured.projection,
+                                         captured.pair_id)
+    if recorder is not None and not captured.camera.name:
+        # Primary camera only (recordings have no camera field). Copies the frame, so the buffer can go back to the pool right after
+        projection = None if captured.projection is None else np.asarray(captured.projection, dtype=np.float64).tolist()
+        recorder.record(captured.stream, frame, publisher.sequences.get(captured.stream, 0), captured.capture_id,
+                        captured.sim_time_ns, {"projection": projection, "pair_id": captured.pair_id})
+    frame_pool.release(frame, tracker)
+    if captured.trace.sent is not None:
+        latency_tracer.record(captured.camera.key(captured.stream), captured.trace)
+
+
+def discard_frame(captured: CapturedFrame, frame: np.ndarray) -> None:
+    """Frames the pipeline drops before sending go straight back to the pool."""
+    frame_pool.release(frame)
+
+
+def imageReceived(camera: CameraOutput, capturedImage: st.camera.CapturedImage):
     resx = capturedImage.properties.ResolutionX
     resy = capturedImage.properties.ResolutionY
     projectionMat = capturedImage.properties.ProjectionMatrix
+    capID = capturedImage.properties.CaptureID
+    trace = FrameTrace(callback=time.perf_counter())
+    trace.requested = capture_manager.completed(capID)
+    sim_time_ns = sim_time_to_ns(capturedImage.get_timestamp())
     # st.logger_info(f"Image received with ID: {capturedImage.properties.CaptureID}, Resolution: {resx}x{resy}, FOV: {capturedImage.properties.FOV}, Projection Matrix: {projectionMat}, Output Mode: {capturedImage.properties.output_mode}")
 
     if capturedImage.properties.output_mode == st.OutputMode.RGB_LDR_sRGB:
         img: st.camera.CapturedImage_RGB8 = capturedImage.as_RGB8()
-        rgb_array = image_RGB_to_ndarray(img.PixelsR, img.PixelsG, img.PixelsB, resx, resy)
-        # Saving for debug purposes
-        # ProcessImage_Save_RGB(capturedImage)
-        publisher.publish_RGB_frame(rgb_array)
-      
+        captured = CapturedFrame(camera, "RGB", img, capID, resx, resy, sim_time_ns, projectionMat, trace)
     elif capturedImage.properties.output_mode == st.OutputMode.Depth_cm:
         img: st.camera.CapturedImage_f32 = capturedImage.as_f32()
-        d_array = image_Depth_to_ndarray(img.Pixels, resx, resy)
-        # Saving for debug purposes
-        # ProcessImage_Save_Depth(capturedImage)
-        publisher.publish_Depth_frame(d_array)
+        captured = CapturedFrame(camera, "DEPTH", img, capID, resx, resy, sim_time_ns, projectionMat, trace,
+                                 fov=capturedImage.properties.FOV)
+    else:
+        return
 
+    for ready in (pairer.offer(capID, captured) if pairer is not None else [captured]):
+        dispatch_frame(ready)
 
 
-publisher = ImagePublisher("0.0.0.0", 55556)
+def dispatch_frame(captured: CapturedFrame) -> None:
+    if pipeline is not None:
+        # Only hand off; conversion and sending happen on the pipeline threads
+        pipeline.submit(captured.camera.key(captured.stream), captured)
+    else:
+        # Called from the image callback and, for expired pair halves, from the main loop;
+        # ZMQ sockets and the FramePool must only be used by one of them at a time
+        with sync_publish_lock:
+            publish_frame(captured, convert_frame(captured))
+
+
+
+# Output buffers for converted frames, reused once each send completes
+frame_pool = FramePool()
+
+# Per-frame timestamps from capture request to send, reported as p50/p95/p99 per stage
+latency_tracer = LatencyTracer()
+latency_report_s = this.GetParam(st.VarType.double, "LatencyReportS")
+
+# Depth noise; a non-negative NoiseSeed makes runs reproducible
+noise_seed = this.GetParam(st.VarType.int32, "NoiseSeed")
+depth_noise = DepthNoise(seed=noise_seed if noise_seed >= 0 else None,
+                         mode=this.GetParam(st.VarType.string, "DepthNoiseMode"))
+
+# Depth pixel format: f32_cm (legacy), or the compact f16_cm / u16_mm
+depth_format = this.GetParam(st.VarType.string, "DepthFormat")
+depth_saturation = this.GetParam(st.VarType.string, "DepthSaturation")
+
+# Settings shared by every camera's publisher
+transport = this.GetParam(st.VarType.string, "Transport")
+codecs = {
+    "RGB": this.GetParam(st.VarType.string, "RGB_Codec"),
+    "DEPTH": this.GetParam(st.VarType.string, "Depth_Codec"),
+}
+codec_quality = this.GetParam(st.VarType.int32, "CodecQuality")
+shm_slots = this.GetParam(st.VarType.int32, "ShmSlots")
+stream_sndbuf = {"DEPTH": 4*1024*1024, "POINTS": 8*1024*1024}
+
+# Optional XYZ point cloud back-projected from each depth frame, on its own port
+projector: Optional[DepthProjector] = None
+projection_failed: set = set()  # POINTS stream keys whose projection error was logged (once each)
+# RGB_Port and Depth_Port both default to 55556, where existing consumers expect both streams.
+# That shared channel can't be conflated (ZMQ would drop one stream for the other), so it
+# queues up to its HWM; opting in to a separate Depth_Port (e.g. 55557) gives each stream a
+# latest-only channel. Subscribers then need the depth port too (ImageSubscriber's `ports`).
+stream_channels = {
+    "RGB": ChannelConfig(this.GetParam(st.VarType.int32, "RGB_Port")),
+    "DEPTH": ChannelConfig(this.GetParam(st.VarType.int32, "Depth_Port"), sndbuf=stream_sndbuf["DEPTH"]),
+}
+if this.GetParam(st.VarType.bool, "PointCloud"):
+    projector = DepthProjector(voxel_m=this.GetParam(st.VarType.double, "PointCloud_VoxelM"))
+    stream_channels["POINTS"] = ChannelConfig(this.GetParam(st.VarType.int32, "PointCloud_Port"),
+                                              sndbuf=stream_sndbuf["POINTS"])
+
+publisher = ImagePublisher(
+    "0.0.0.0", 55556,
+    log=st,
+    depth_format=depth_format,
+    transport=transport,
+    codecs=codecs,
+    quality=codec_quality,
+    shm_slots=shm_slots,
+    # Giving a stream its own port gives it its own conflated socket
+    channels=stream_channels,
+    ack_port=this.GetParam(st.VarType.int32, "AckPort"),
+    # Optional downsampled levels / crops, each on its own port
+    views={
+        "RGB": parse_views(this.GetParam(st.VarType.string, "RGB_PyramidPorts"),
+                           this.GetParam(st.VarType.string, "RGB_ROIs")),
+        "DEPTH": parse_views(this.GetParam(st.VarType.string, "Depth_PyramidPorts"),
+                             this.GetParam(st.VarType.string, "Depth_ROIs")),
+    },
+)
 
 
 # Configure RGB camera with custom settings
@@ -522,35 +757,175 @@ depth_config = CameraConfig(
 )
 publisher.setup_depth_camera(depth_config)
 
+cameras = [CameraOutput("", camera, publisher, tuple(stream_channels))]
+
+# Extra cameras (stereo pairs, rear/hazard cameras): ExtraCameras = N, then for i = 1..N an
+# entityRef "Camera<i>" and a string "Camera<i>_Ports" naming its streams and their ports, e.g.
+# "RGB=55570,DEPTH=55571,POINTS=55572". Rates come from each camera's RGB_FreqHz/Depth_FreqHz;
+# transport, codecs and depth settings are shared, and so are the scheduler and pipeline workers.
+for i in range(1, this.GetParam(st.VarType.int32, "ExtraCameras") + 1):
+    entity = this.GetParam(st.VarType.entityRef, f"Camera{i}")
+    ports = parse_stream_ports(this.GetParam(st.VarType.string, f"Camera{i}_Ports"))
+    if not ports:
+        raise ValueError(f"Camera{i}_Ports is empty; list at least one STREAM=port")
+    if "POINTS" in ports:
+        if "DEPTH" not in ports:
+            raise ValueError(f"Camera{i}_Ports: POINTS is computed from DEPTH, which needs a port too")
+        if projector is None:
+            projector = DepthProjector(voxel_m=this.GetParam(st.VarType.double, "PointCloud_VoxelM"))
+    extra = ImagePublisher(
+        "0.0.0.0", next(iter(ports.values())),
+        log=st,
+        depth_format=depth_format,
+        transport=transport,
+        codecs={s: c for s, c in codecs.items() if s in ports},
+        quality=codec_quality,
+        shm_slots=shm_slots,
+        channels={s: ChannelConfig(p, sndbuf=stream_sndbuf.get(s, ChannelConfig.sndbuf)) for s, p in ports.items()},
+    )
+    size = CameraConfig(entity.GetParam(st.VarType.int32, "ResolutionX"), entity.GetParam(st.VarType.int32, "ResolutionY"))
+    if "RGB" in ports:
+        extra.setup_rgb_camera(size)
+    if "DEPTH" in ports:
+        extra.setup_depth_camera(size)
+    cameras.append(CameraOutput(f"cam{i}", entity, extra, tuple(ports)))
+    st.logger_info(f"Camera{i}: publishing {', '.join(f'{s} on {p}' for s, p in ports.items())}")
+
+# Scheduler / queue key -> (camera, captured stream)
+stream_keys: Dict[str, Tuple[CameraOutput, str]] = {
+    cam.key(stream): (cam, stream) for cam in cameras for stream in cam.streams if stream in ("RGB", "DEPTH")
+}
+
+# Optional recording of everything published, written on a background thread
+recorder: Optional[FrameRecorder] = None
+if this.GetParam(st.VarType.bool, "Record"):
+    recording_dir = os.path.join(output_full_filepath, datetime.datetime.now().strftime("recording_%Y%m%d_%H%M%S"))
+    recorder = FrameRecorder(
+        recording_dir,
+        codecs={
+            "RGB": this.GetParam(st.VarType.string, "Record_RGB_Codec"),
+            "DEPTH": this.GetParam(st.VarType.string, "Record_Depth_Codec"),
+        },
+        segment_bytes=this.GetParam(st.VarType.int32, "RecordSegmentMB") << 20,
+        max_queue_bytes=this.GetParam(st.VarType.int32, "RecordQueueMB") << 20,
+        drop_policy=this.GetParam(st.VarType.string, "RecordDropPolicy"),
+    )
+    st.logger_info(f"Recording frames to {recording_dir}")
+
+# Paired mode: on ticks where both streams are due (every tick when RGB_FreqHz == Depth_FreqHz),
+# RGB and depth are captured together and published with a shared pair ID and stamp
+pairer: Optional[CapturePairer] = None
+if this.GetParam(st.VarType.bool, "PairRGBD"):
+    pairer = CapturePairer(timeout_s=this.GetParam(st.VarType.double, "PairTimeoutS"))
+    if transport == TRANSPORT_SINGLE:
+        st.logger_warn("PairRGBD: the single transport's header has no pair ID; paired frames go out unmarked")
+
+# Conversion and sending run off the image callback unless disabled
+pipeline: Optional[FramePipeline] = None
+sync_publish_lock = threading.Lock()
+if this.GetParam(st.VarType.bool, "AsyncPipeline"):
+    pipeline = FramePipeline(convert_frame, publish_frame, discard_frame,
+                             num_workers=this.GetParam(st.VarType.int32, "PipelineWorkers"))
+
 
 ################## Main Loop #####################
 exit_flag = False
 frame_rate = this.GetParam(st.VarType.double, "LoopFreqHz")
 
-RGB_timer = 0.0
-Depth_timer = 0.0
+# Bounds outstanding captures so latency can't grow when rendering falls behind
+capture_manager = CaptureManager(
+    max_in_flight=this.GetParam(st.VarType.int32, "MaxCapturesInFlight"),
+    timeout_s=this.GetParam(st.VarType.double, "CaptureTimeoutS"),
+)
+
+
+def backpressure_counters(key: str) -> Tuple[int, int, Optional[int]]:
+    """(lost, published, acked) totals for the RateController."""
+    cam, stream = stream_keys[key]
+    lost = (cam.publisher.send_failures.get(stream, 0) + capture_manager.skipped.get(key, 0)
+            + capture_manager.timed_out.get(key, 0))
+    if pipeline is not None:
+        lost += pipeline.convert_queue.dropped.get(key, 0) + pipeline.send_queue.dropped.get(key, 0)
+    acked = cam.publisher.poll_acks().get(stream, 0) if cam.publisher.ack_socket is not None else None
+    return lost, cam.publisher.sequences.get(stream, 0), acked
+
+
+# Adaptive mode: back off each stream's rate (and lossy codec quality) while frames are being
+# lost or not acknowledged, so the sim stops rendering frames nobody consumes
+rate_controller: Optional[RateController] = None
+if this.GetParam(st.VarType.bool, "AdaptiveRate"):
+    quality_caps = {}
+    if this.GetParam(st.VarType.bool, "AdaptiveQuality"):
+        for key, (cam, stream) in stream_keys.items():
+            codec = cam.publisher.codecs.get(stream)
+            if codec is not None and codec.name in LOSSY_CODECS:
+                quality_caps[key] = codec.quality if codec.quality >= 0 else 90  # 90 = cv2 codec default
+    rate_controller = RateController(
+        list(stream_keys), backpressure_counters,
+        window_s=this.GetParam(st.VarType.double, "AdaptiveWindowS"),
+        min_scale=this.GetParam(st.VarType.double, "AdaptiveMinScale"),
+        quality_caps=quality_caps,
+        set_quality=lambda key, quality: stream_keys[key][0].publisher.set_quality(stream_keys[key][1], quality),
+        log=st.logger_info,
+    )
+
+
+def stream_rate(cam: CameraOutput, stream: str) -> float:
+    """The camera's configured rate for `stream`, scaled down by the adaptive mode."""
+    rate = cam.entity.GetParam(st.VarType.double, "RGB_FreqHz" if stream == "RGB" else "Depth_FreqHz")
+    return rate * (rate_controller.scale(cam.key(stream)) if rate_controller is not None else 1.0)
+
+
+# Captures fire on perf_counter deadlines; LoopFreqHz only bounds how long the loop sleeps.
+# The camera's rates are the caps; the adaptive mode scales them down.
+scheduler = RateScheduler(
+    {key: (lambda cam=cam, stream=stream: stream_rate(cam, stream)) for key, (cam, stream) in stream_keys.items()},
+    max_sleep_s=1.0 / frame_rate,
+    refresh_s=this.GetParam(st.VarType.double, "RateRefreshS"),
+    label="Capture rates",
+    log=st.logger_info,
+)
 
 st.OnScreenLogMessage(f"Starting ImageSender Loop", "CamTest", st.Severity.Info)
+last_latency_report = time.perf_counter()
 
 while not exit_flag:
-    time.sleep(1.0 / frame_rate)
-    dt = 1.0 / frame_rate
-    RGB_timer += dt
-    Depth_timer += dt
-
-    RGB_period = 1.0/camera.GetParam(st.VarType.double, "RGB_FreqHz")
-    Depth_period = 1.0/camera.GetParam(st.VarType.double, "Depth_FreqHz")
-    
-    if(RGB_timer >= RGB_period):
-        # st.OnScreenLogMessage(f"RGB cmd freq: {camera.GetParam(st.VarType.double, 'RGB_FreqHz')}, Depth cmd freq: {camera.GetParam(st.VarType.double, 'Depth_FreqHz')}", "CamTest", st.Severity.Info)
-        RGB_timer = 0.0
-        capture_id = capture_image(camera)
-        st.camera.OnImageReceived(capture_id, lambda capturedImage: imageReceived(capturedImage))
-
-    if(Depth_timer >= Depth_period):
-        # st.OnScreenLogMessage(f"RGB cmd freq: {camera.GetParam(st.VarType.double, 'RGB_FreqHz')}, Depth cmd freq: {camera.GetParam(st.VarType.double, 'Depth_FreqHz')}", "CamTest", st.Severity.Info)
-        Depth_timer = 0.0
-        capture_id = capture_image_depth(camera)
-        st.camera.OnImageReceived(capture_id, lambda capturedImage: imageReceived(capturedImage))
-
+    requested = {}  # stream key -> capture ID
+    for key in scheduler.wait():
+        if not capture_manager.try_acquire(key):
+            continue  # renderer still busy with this stream; skip the tick
+        cam, stream = stream_keys[key]
+        if stream == "RGB":
+            # st.OnScreenLogMessage(f"RGB cmd freq: {camera.GetParam(st.VarType.double, 'RGB_FreqHz')}, Depth cmd freq: {camera.GetParam(st.VarType.double, 'Depth_FreqHz')}", "CamTest", st.Severity.Info)
+            requested[key] = capture_image(cam.entity)
+        else:
+            requested[key] = capture_image_depth(cam.entity)
+        capture_manager.requested(key, requested[key])
+    if pairer is not None:
+        for cam in cameras:
+            rgb_id, depth_id = requested.get(cam.key("RGB")), requested.get(cam.key("DEPTH"))
+            if rgb_id is not None and depth_id is not None:
+                # Registered before the callbacks are, so neither half can slip through unpaired
+                pairer.add(rgb_id, depth_id)
+        for captured in pairer.expire():
+            dispatch_frame(captured)
+    for key, capture_id in requested.items():
+        cam = stream_keys[key][0]
+        st.camera.OnImageReceived(capture_id, lambda capturedImage, cam=cam: imageReceived(cam, capturedImage))
+    capture_manager.maybe_report()
+    if rate_controller is not None:
+        rate_controller.update()
+    if latency_report_s > 0 and time.perf_counter() - last_latency_report >= latency_report_s:
+        last_latency_report = time.perf_counter()
+        snapshot = latency_tracer.report()
+        if snapshot:
+            st.logger_info("Frame latency " + format_latency_report(snapshot))
+
+if pipeline is not None:
+    pipeline.close()
+if pairer is not None:
+    st.logger_info(f"RGB-D pairs: {pairer.paired} published, {pairer.timed_out} timed out")
+if recorder is not None:
+    recorder.close()
+    st.logger_info(f"Recorded {recorder.recorded} frames ({recorder.dropped} dropped) to {recorder.directory}")
 st.leave_sim()
\ No newline at end of file
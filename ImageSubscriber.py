@@ -0,0 +1,376 @@
+"""
+Reference subscriber for ImagePublisher's camera stream.
+
+    sub = ImageSubscriber("127.0.0.1", 55556, transport="multipart")
+    while True:
+        frame = sub.recv(timeout_ms=1000)
+        if frame is not None:
+            use(frame.stream, frame.pixels)   # read-only view, see below for how long it lasts
+
+or register callbacks and let it run a receive thread:
+
+    sub.on_frame("RGB", handle_rgb)
+    sub.start()
+
+or, when the publisher runs with PairRGBD, take matching RGB-D pairs:
+
+    rgb, depth = sub.recv_pair(timeout_ms=1000) or (None, None)
+
+or, from asyncio code:
+
+    async for frame in sub:
+        ...
+
+Sockets use the publisher's options (small HWM, no linger), and with
+`conflate` each stream is delivered as its newest frame, also when RGB and
+depth share one port (per stream in software there, since ZMQ's CONFLATE
+would drop one stream for the other). Headers are parsed at fixed offsets and
+pixels are never copied for raw payloads.
+
+Pixels of the single and multipart transports stay valid as long as you hold
+`frame`. With the shm transport they are a view into the publisher's ring,
+which reuses the slot `ShmSlots` frames later (~200 ms at the default rates):
+check `frame.still_valid()` after using them, or copy what you keep. Frames
+already overwritten when they would be delivered are dropped and counted as
+`overwritten`. Without `conflate`, each stream keeps at most `max_pending`
+undelivered frames, so a stream the caller never asks for (e.g. depth while
+calling `recv(stream="RGB")`) drops its oldest frames (`evicted`) instead of
+piling up. `stats()` gives per-stream receive rate, sequence gaps and
+send-to-receive latency (binary headers only, publisher and subscriber
+clocks must agree, e.g. the same host).
+
+Like ImageTransport, this module doesn't need spaceteams.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import zmq
+
+from ImageTransport import (FRAME_DTYPES, HEADER_MAGIC, TRANSPORT_MULTIPART, TRANSPORT_SHM, TRANSPORT_SINGLE,
+                            TRANSPORTS, FrameHeader, LatencyHistogram, ShmFrameSubscriber, pack_ack, payload_to_pixels)
+
+
+@dataclass
+class ReceivedFrame:
+    stream: str
+    header: FrameHeader
+    pixels: np.ndarray  # read-only view over the message (raw) or a decoded array
+    projection: Optional[np.ndarray]
+    recv_time_ns: int  # time.time_ns() at receive
+    _message: object = None  # keeps the ZMQ message (and so the view) alive
+    _shm_slot: Optional[tuple] = None  # (ring, slot, seq) the pixels live in, shm transport only
+
+    def still_valid(self) -> bool:
+        """Whether `pixels` still hold this frame; only shm frames can be overwritten."""
+        if self._shm_slot is None:
+            return True
+        ring, slot, seq = self._shm_slot
+        return ring.is_valid(slot, seq)
+
+
+def parse_legacy_header_fixed(buf) -> tuple:
+    """Parse `RGB#HHHH#WWWW#CCCC#` / `DEPTH#HHHH#WWWW#C#` at fixed offsets.
+
+    Returns:
+        tuple: stream, height, width, channels, header length in bytes
+    """
+    if buf[0] == ord("R"):
+        return "RGB", int(buf[4:8]), int(buf[9:13]), int(buf[14:18]), 19
+    if buf[0] == ord("D"):
+        return "DEPTH", int(buf[6:10]), int(buf[11:15]), int(buf[16:17]), 18
+    raise ValueError(f"Unknown frame header {bytes(buf[:8])!r}")
+
+
+class StreamStats:
+    """Receive-side counters for one stream; the windowed values reset on each `ImageSubscriber.stats()`."""
+    def __init__(self):
+        self.received = 0
+        self.conflated = 0  # superseded by a newer frame of the same stream before delivery
+        self.unpaired = 0  # dropped by recv_pair for lacking a partner
+        self.overwritten = 0  # shm frames whose ring slot was reused before delivery
+        self.evicted = 0  # dropped from a full pending queue (not conflating, stream not being read)
+        self.sequence_gaps = 0  # frames the publisher sent that never arrived
+        self.last_sequence: Optional[int] = None
+        self.window_start = time.perf_counter()
+        self.window_frames = 0
+        self.latency = LatencyHistogram()
+
+
+class ImageSubscriber:
+    def __init__(self, host: str = "127.0.0.1", port: int = 55556, transport: str = TRANSPORT_SINGLE,
+                 ports: Optional[Dict[str, int]] = None, conflate: bool = True,
+                 context: Optional[zmq.Context] = None, ack_port: int = 0, max_pending: int = 32):
+        """Connect to an ImagePublisher.
+
+        Args:
+            host (str): Publisher host
+            port (int): Publisher port (all streams, unless `ports` says otherwise)
+            transport (str): Must match the publisher's transport
+            ports (Dict[str, int]): Per-stream ports when the publisher uses separate channels
+            conflate (bool): Only deliver the newest frame of each stream
+            context (zmq.Context): Context to use, default the shared instance
+            ack_port (int): The publisher's ACK port, if it adapts its rate to subscribers;
+                every frame handed out by recv/recv_pair is then acknowledged (binary-header
+                transports only, the legacy header has no sequence number)
+            max_pending (int): Undelivered frames kept per stream without `conflate`;
+                beyond that the oldest are dropped
+        """
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport '{transport}', expected one of {TRANSPORTS}")
+        self.transport = transport
+        self.conflate = conflate
+        self.context = context or zmq.Context.instance()
+
+        # One socket per distinct port; a socket that carries a single stream of
+        # single-part messages can let ZMQ do the conflation
+        streams_by_port: Dict[int, List[str]] = {}
+        for stream in FRAME_DTYPES:
+            streams_by_port.setdefault((ports or {}).get(stream, port), []).append(stream)
+        self.sockets: List[zmq.Socket] = []
+        self._shm: Dict[zmq.Socket, ShmFrameSubscriber] = {}
+        self.poller = zmq.Poller()
+        for p, streams in streams_by_port.items():
+            if transport == TRANSPORT_SHM:
+                shm_sub = ShmFrameSubscriber(host, p, self.context, conflate=conflate and len(streams) == 1)
+                socket = shm_sub.socket
+                self._shm[socket] = shm_sub
+            else:
+                socket = self.context.socket(zmq.SUB)
+                socket.setsockopt(zmq.RCVHWM, 2)
+                socket.setsockopt(zmq.LINGER, 0)
+                if conflate and transport == TRANSPORT_SINGLE and len(streams) == 1:
+                    socket.setsockopt(zmq.CONFLATE, 1)
+                socket.setsockopt(zmq.SUBSCRIBE, b"")
+                socket.connect(f"tcp://{host}:{p}")
+            self.sockets.append(socket)
+            self.poller.register(socket, zmq.POLLIN)
+
+        self.stream_stats: Dict[str, StreamStats] = {s: StreamStats() for s in FRAME_DTYPES}
+        # Undelivered frames per stream
+        self._pending: Dict[str, deque] = {s: deque(maxlen=max_pending) for s in FRAME_DTYPES}
+        self._callbacks: Dict[str, List[Callable[[ReceivedFrame], None]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._ack_socket: Optional[zmq.Socket] = None
+        if ack_port:
+            self._ack_socket = self.context.socket(zmq.PUSH)
+            self._ack_socket.setsockopt(zmq.SNDHWM, 16)
+            self._ack_socket.setsockopt(zmq.LINGER, 0)
+            self._ack_socket.connect(f"tcp://{host}:{ack_port}")
+
+    def _read(self, socket: zmq.Socket) -> Optional[ReceivedFrame]:
+        """Receive one message from a socket that is ready."""
+        shm_sub = self._shm.get(socket)
+        if shm_sub is not None:
+            frame = shm_sub.recv(zmq.NOBLOCK)
+            if frame is None:
+                return None  # overwritten before we got to it; shows up as a sequence gap
+            header, pixels = frame
+            return ReceivedFrame(header.stream, header, pixels, None, time.time_ns(), shm_sub, shm_sub.last_slot())
+
+        if self.transport == TRANSPORT_MULTIPART:
+            parts = socket.recv_multipart(zmq.NOBLOCK, copy=False)
+            recv_time_ns = time.time_ns()
+            header_buf = parts[0].buffer
+            if header_buf[:len(HEADER_MAGIC)] == HEADER_MAGIC:
+                header = FrameHeader.unpack(header_buf)
+            else:
+                header = self._legacy_header(*parse_legacy_header_fixed(header_buf)[:4], len(parts[1]))
+            projection = np.frombuffer(parts[2].buffer, dtype=np.float64) if len(parts) > 2 else None
+            return ReceivedFrame(header.stream, header, payload_to_pixels(header, parts[1].buffer), projection,
+                                 recv_time_ns, parts)
+
+        msg = socket.recv(zmq.NOBLOCK, copy=False)
+        recv_time_ns = time.time_ns()
+        buf = msg.buffer
+        stream, height, width, channels, header_len = parse_legacy_header_fixed(buf)
+        header = self._legacy_header(stream, height, width, channels, len(buf) - header_len)
+        return ReceivedFrame(stream, header, payload_to_pixels(header, buf[header_len:]), None, recv_time_ns, msg)
+
+    @staticmethod
+    def _legacy_header(stream: str, height: int, width: int, channels: int, payload_bytes: int) -> FrameHeader:
+        dtype = np.dtype(FRAME_DTYPES[stream])
+        return FrameHeader(stream, dtype, height, width, channels, width * channels * dtype.itemsize,
+                           payload_bytes=payload_bytes)
+
+    def _account(self, frame: ReceivedFrame) -> None:
+        stats = self.stream_stats[frame.stream]
+        stats.received += 1
+        stats.window_frames += 1
+        seq = frame.header.sequence
+        if seq:
+            if stats.last_sequence is not None and seq > stats.last_sequence + 1:
+                stats.sequence_gaps += seq - stats.last_sequence - 1
+            stats.last_sequence = seq
+        if frame.header.send_time_ns:
+            stats.latency.record((frame.recv_time_ns - frame.header.send_time_ns) / 1e6)
+
+    def _drain(self, timeout_ms: Optional[int]) -> None:
+        """Wait up to `timeout_ms` (None = forever) for traffic, then take everything queued."""
+        ready = dict(self.poller.poll(timeout_ms))
+        while ready:
+            for socket in ready:
+                try:
+                    frame = self._read(socket)
+                except zmq.Again:
+                    continue
+                if frame is None:
+                    continue
+                self._account(frame)
+                pending = self._pending[frame.stream]
+                if self.conflate and pending:
+                    pending.popleft()
+                    self.stream_stats[frame.stream].conflated += 1
+                elif len(pending) == pending.maxlen:
+                    self.stream_stats[frame.stream].evicted += 1  # append drops the oldest
+                pending.append(frame)
+            ready = dict(self.poller.poll(0))
+
+    def _discard_overwritten(self) -> None:
+        for stream, pending in self._pending.items():
+            while pending and not pending[0].still_valid():
+                pending.popleft()
+                self.stream_stats[stream].overwritten += 1
+
+    def _pop(self, stream: Optional[str]) -> Optional[ReceivedFrame]:
+        """Oldest pending frame of `stream`, or across all streams if None."""
+        self._discard_overwritten()
+        if stream is None:
+            heads = [q for q in self._pending.values() if q]
+            if not heads:
+                return None
+            return min(heads, key=lambda q: q[0].recv_time_ns).popleft()
+        pending = self._pending[stream]
+        return pending.popleft() if pending else None
+
+    def recv(self, timeout_ms: Optional[int] = None, stream: Optional[str] = None) -> Optional[ReceivedFrame]:
+        """Next frame (of `stream`, if given), or None after `timeout_ms` (None waits forever).
+
+        With `conflate`, this is the newest frame of that stream received so far.
+        """
+        deadline = None if timeout_ms is None else time.perf_counter() + timeout_ms / 1000
+        while True:
+            self._drain(0)
+            frame = self._pop(stream)
+            if frame is not None:
+                self._ack(frame)
+                return frame
+            if deadline is None:
+                self._drain(None)
+                continue
+            remaining_ms = int((deadline - time.perf_counter()) * 1000)
+            if remaining_ms <= 0:
+                return None
+            self._drain(remaining_ms)
+
+    def _ack(self, frame: ReceivedFrame) -> None:
+        if self._ack_socket is None or not frame.header.sequence:
+            return
+        try:
+            self._ack_socket.send(pack_ack(frame.stream, frame.header.sequence), zmq.NOBLOCK)
+        except zmq.Again:
+            pass  # publisher not reading ACKs; it will see a low ACK rate anyway
+
+    def _pop_pair(self) -> Optional[Tuple[ReceivedFrame, ReceivedFrame]]:
+        self._discard_overwritten()
+        rgb, depth = self._pending["RGB"], self._pending["DEPTH"]
+        while rgb and depth:
+            r, d = rgb[0].header.pair_id, depth[0].header.pair_id
+            if r and r == d:
+                return rgb.popleft(), depth.popleft()
+            # Pair IDs only grow, so the smaller head (or an unpaired one) can't be matched any more
+            stream = "RGB" if r < d else "DEPTH"
+            self._pending[stream].popleft()
+            self.stream_stats[stream].unpaired += 1
+        return None
+
+    def recv_pair(self, timeout_ms: Optional[int] = None) -> Optional[Tuple[ReceivedFrame, ReceivedFrame]]:
+        """Next (RGB, depth) frames with the same pair ID, or None after `timeout_ms` (None waits forever).
+
+        Frames that can no longer be matched are dropped. Needs a binary-header transport.
+        """
+        deadline = None if timeout_ms is None else time.perf_counter() + timeout_ms / 1000
+        while True:
+            self._drain(0)
+            pair = self._pop_pair()
+            if pair is not None:
+                self._ack(pair[0])
+                self._ack(pair[1])
+                return pair
+            if deadline is None:
+                self._drain(None)
+                continue
+            remaining_ms = int((deadline - time.perf_counter()) * 1000)
+            if remaining_ms <= 0:
+                return None
+            self._drain(remaining_ms)
+
+    def on_frame(self, stream: Optional[str], callback: Callable[[ReceivedFrame], None]) -> None:
+        """Call `callback(frame)` from the receive thread for each frame of `stream` (None = every stream)."""
+        self._callbacks.setdefault(stream, []).append(callback)
+
+    def start(self) -> None:
+        """Start the receive thread that dispatches to the `on_frame` callbacks."""
+        self._thread = threading.Thread(target=self._run, name="ImageSubscriber", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            frame = self.recv(timeout_ms=100)
+            if frame is None:
+                continue
+            for callback in self._callbacks.get(frame.stream, []) + self._callbacks.get(None, []):
+                callback(frame)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ReceivedFrame:
+        # The blocking receive runs on the default executor, one at a time
+        loop = asyncio.get_running_loop()
+        while not self._closed:
+            frame = await loop.run_in_executor(None, self.recv, 100)
+            if frame is not None:
+                return frame
+        raise StopAsyncIteration
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-stream receive stats; rate and latency cover the time since the previous call."""
+        now = time.perf_counter()
+        out = {}
+        for stream, s in self.stream_stats.items():
+            out[stream] = {
+                "received": s.received,
+                "rate_hz": s.window_frames / max(now - s.window_start, 1e-9),
+                "conflated": s.conflated,
+                "unpaired": s.unpaired,
+                "overwritten": s.overwritten,
+                "evicted": s.evicted,
+                "sequence_gaps": s.sequence_gaps,
+                "latency_p50_ms": s.latency.percentile(50),
+                "latency_p95_ms": s.latency.percentile(95),
+                "latency_p99_ms": s.latency.percentile(99),
+                "latency_max_ms": s.latency.max_ms,
+            }
+            s.window_start = now
+            s.window_frames = 0
+            s.latency = LatencyHistogram()
+        return out
+
+    def close(self) -> None:
+        self._closed = True
+        if self._thread is not None:
+            self._thread.join()
+        if self._ack_socket is not None:
+            self._ack_socket.close(0)
+        for socket in self.sockets:
+            shm_sub = self._shm.get(socket)
+            if shm_sub is not None:
+                shm_sub.close()
+            else:
+                socket.close(0)
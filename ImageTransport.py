@@ -0,0 +1,761 @@
+"""
+Wire-level helpers shared by ImageSender's ImagePublisher and its subscribers.
+
+Nothing in this module talks to the simulator, so consumer-side code (ROS
+bridges, test tools, autonomy stacks) can import it without spaceteams.
+"""
+import bisect
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+import zmq
+
+# Optional: only needed for the compressed codecs
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Header and pixels concatenated into one message (what every existing
+# consumer parses today).
+TRANSPORT_SINGLE = "single"
+# Header and pixels as two frames of one multipart message; the pixel frame is
+# handed to ZMQ straight from the ndarray buffer.
+TRANSPORT_MULTIPART = "multipart"
+# Frames written into a shared-memory ring; only a small notification
+# (ring name, slot, sequence) goes over ZMQ. Same-host consumers only.
+TRANSPORT_SHM = "shm"
+TRANSPORTS = (TRANSPORT_SINGLE, TRANSPORT_MULTIPART, TRANSPORT_SHM)
+
+# Pixel dtype of each stream as produced by ImageSender (and assumed for the
+# legacy header, which can't carry a dtype)
+FRAME_DTYPES = {
+    "RGB": np.uint8,
+    "DEPTH": np.float32,
+    "POINTS": np.float32,  # 1xNx3 packed XYZ in metres (see PointCloud.py)
+}
+
+# Sentinel ImageSender writes into depth pixels beyond the max range
+DEPTH_NODATA_CM = 9_999_999.0
+
+# Depth output formats: name -> (dtype, units). Nodata is DEPTH_NODATA_CM for
+# f32_cm, +inf for f16_cm and DEPTH_NODATA_MM for u16_mm.
+DEPTH_FORMATS = {
+    "f32_cm": (np.float32, "cm"),
+    "f16_cm": (np.float16, "cm"),
+    "u16_mm": (np.uint16, "mm"),
+}
+DEPTH_NODATA_MM = 65535
+DEPTH_UNITS = {np.dtype(dtype): units for dtype, units in DEPTH_FORMATS.values()}
+DEPTH_FORMAT_NAMES = {np.dtype(dtype): name for name, (dtype, _) in DEPTH_FORMATS.items()}
+
+
+def depth_nodata(dtype) -> float:
+    """Nodata value of depth pixels of this dtype (see DEPTH_FORMATS)."""
+    dtype = np.dtype(dtype)
+    if dtype == np.uint16:
+        return DEPTH_NODATA_MM
+    if dtype == np.float16:
+        return np.inf
+    return DEPTH_NODATA_CM
+
+
+#############################
+# Binary frame header (multipart transport)
+####################
+HEADER_MAGIC = b"STIM"
+HEADER_VERSION = 6
+
+# Stream IDs carried in the header
+STREAM_IDS = {
+    "RGB": 0,
+    "DEPTH": 1,
+    "POINTS": 2,
+}
+STREAM_NAMES = {v: k for k, v in STREAM_IDS.items()}
+
+# Units of the pixel values carried in the header ("" = not a measurement, e.g. RGB)
+UNITS_IDS = {
+    "": 0,
+    "cm": 1,
+    "mm": 2,
+    "m": 3,
+}
+UNITS_NAMES = {v: k for k, v in UNITS_IDS.items()}
+
+# Pixel dtype codes carried in the header
+DTYPE_CODES = {
+    np.dtype(np.uint8): 1,
+    np.dtype(np.uint16): 2,
+    np.dtype(np.float16): 3,
+    np.dtype(np.float32): 4,
+    np.dtype(np.float64): 5,
+}
+DTYPES = {v: k for k, v in DTYPE_CODES.items()}
+
+# Layout (little-endian, 80 bytes):
+#   magic 4s | version B | stream B | dtype B | codec B
+#   height I | width I | channels I | row_stride I (bytes)
+#   sequence Q | capture_id Q | sim_time_ns q | send_time_ns q | intrinsics_rev I | payload_bytes I
+#   level B | roi B | units B | pad 1 | origin_x I | origin_y I | pair_id I
+_HEADER_STRUCT = struct.Struct("<4sBBBBIIIIQQqqIIBBBxIII")
+HEADER_SIZE = _HEADER_STRUCT.size
+
+
+@dataclass
+class FrameHeader:
+    stream: str
+    dtype: np.dtype
+    height: int
+    width: int
+    channels: int
+    row_stride: int
+    sequence: int = 0
+    capture_id: int = 0
+    sim_time_ns: int = 0  # SimClock time of the capture (TAI), ns since 1970-01-01
+    send_time_ns: int = 0  # Publisher wall clock (time.time_ns()) when the frame was sent
+    intrinsics_rev: int = 0  # Bumped whenever the projection matrix changes
+    payload_bytes: int = 0
+    codec: str = "raw"  # How the payload encodes the pixels described above
+    version: int = HEADER_VERSION
+    # Derived views (see ImagePublisher's ViewConfig): pyramid level (downsampled by
+    # 2**level), ROI number (0 = whole frame) and the view's top-left corner in
+    # full-resolution pixels
+    level: int = 0
+    roi: int = 0
+    origin_x: int = 0
+    origin_y: int = 0
+    units: str = ""  # see UNITS_IDS; depth is "cm" or "mm" depending on the format
+    pair_id: int = 0  # Shared by the RGB and depth frames of one paired capture (0 = unpaired)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (self.height, self.width, self.channels) if self.channels > 1 else (self.height, self.width)
+
+    def pack(self) -> bytes:
+        return _HEADER_STRUCT.pack(
+            HEADER_MAGIC, HEADER_VERSION, STREAM_IDS[self.stream], DTYPE_CODES[np.dtype(self.dtype)],
+            CODEC_IDS[self.codec],
+            self.height, self.width, self.channels, self.row_stride,
+            self.sequence, self.capture_id, self.sim_time_ns, self.send_time_ns, self.intrinsics_rev,
+            self.payload_bytes, self.level, self.roi, UNITS_IDS[self.units], self.origin_x, self.origin_y,
+            self.pair_id)
+
+    @classmethod
+    def unpack(cls, buf) -> "FrameHeader":
+        """Parse a packed header from any bytes-like object (fixed offsets, no string handling)."""
+        (magic, version, stream, dtype, codec,
+         height, width, channels, row_stride,
+         sequence, capture_id, sim_time_ns, send_time_ns, intrinsics_rev, payload_bytes,
+         level, roi, units, origin_x, origin_y, pair_id) = _HEADER_STRUCT.unpack_from(buf)
+        if magic != HEADER_MAGIC:
+            raise ValueError(f"Bad frame header magic {magic!r}")
+        if version != HEADER_VERSION:
+            raise ValueError(f"Unsupported frame header version {version} (expected {HEADER_VERSION})")
+        return cls(STREAM_NAMES[stream], DTYPES[dtype], height, width, channels, row_stride,
+                   sequence, capture_id, sim_time_ns, send_time_ns, intrinsics_rev, payload_bytes,
+                   CODEC_NAMES[codec], version, level, roi, origin_x, origin_y, UNITS_NAMES[units],
+                   pair_id)
+
+    @classmethod
+    def for_frame(cls, stream: str, frame: np.ndarray, **fields) -> "FrameHeader":
+        """Describe a C-contiguous HxW or HxWxC `frame`."""
+        channels = frame.shape[2] if frame.ndim > 2 else 1
+        fields.setdefault("payload_bytes", frame.nbytes)
+        if stream == "DEPTH":
+            fields.setdefault("units", DEPTH_UNITS.get(frame.dtype, ""))
+        elif stream == "POINTS":
+            fields.setdefault("units", "m")
+        return cls(stream, frame.dtype, frame.shape[0], frame.shape[1], channels,
+                   frame.strides[0], **fields)
+
+
+def legacy_header(frame_type: str, frame: np.ndarray) -> str:
+    """Build the ASCII `TYPE#HEIGHT#WIDTH#CHANNELS#` header."""
+    if frame_type == "RGB":
+        return f"{frame_type}#{frame.shape[0]:04d}#{frame.shape[1]:04d}#{frame.shape[2]:04d}#"
+    elif frame_type == "DEPTH":
+        return f"{frame_type}#{frame.shape[0]:04d}#{frame.shape[1]:04d}#1#"
+    raise ValueError(f"Unknown frame type: {frame_type}")
+
+
+def parse_legacy_header(header: bytes) -> Tuple[str, int, int, int]:
+    """Parse an ASCII `TYPE#HEIGHT#WIDTH#CHANNELS#` header.
+
+    Returns:
+        Tuple[str, int, int, int]: frame type, height, width, channels
+    """
+    frame_type, height, width, channels = header.decode("ascii").split("#")[:4]
+    return frame_type, int(height), int(width), int(channels)
+
+
+#############################
+# Payload codecs
+####################
+class FrameCodec:
+    """Raw pixels; the base for the compressed codecs below."""
+    name = "raw"
+
+    def __init__(self, quality: int = -1):
+        self.quality = quality
+
+    def encode(self, frame: np.ndarray):
+        """Return a bytes-like payload for the C-contiguous `frame`."""
+        return frame
+
+    def decode(self, payload, header: FrameHeader) -> np.ndarray:
+        """Rebuild the pixels described by `header` from an encoded payload."""
+        return np.frombuffer(payload, dtype=header.dtype).reshape(header.shape)
+
+
+class CvImageCodec(FrameCodec):
+    """8-bit RGB through cv2.imencode; `quality` is 0-100 for JPEG/WebP."""
+    extensions = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+    def __init__(self, name: str, quality: int = -1):
+        super().__init__(quality)
+        if cv2 is None:
+            raise ImportError(f"The '{name}' codec requires OpenCV (cv2)")
+        self.name = name
+        self.ext = self.extensions[name]
+        if name == "jpeg":
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality if quality >= 0 else 90]
+        elif name == "webp":
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, quality if quality >= 0 else 90]
+        else:
+            # PNG is lossless either way; favour speed over size
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+    def encode(self, frame: np.ndarray):
+        # ImageSender frames are RGB, OpenCV expects BGR
+        ok, buf = cv2.imencode(self.ext, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), self.params)
+        if not ok:
+            raise ValueError(f"cv2.imencode failed for {self.name}")
+        return buf
+
+    def decode(self, payload, header: FrameHeader) -> np.ndarray:
+        bgr = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+class DepthPng16Codec(FrameCodec):
+    """Depth as a 16-bit PNG of millimetres.
+
+    Centimetre input (f32_cm/f16_cm) is rounded to the nearest millimetre, and
+    valid ranges beyond 65.534 m become nodata (like DepthSaturation "nodata"),
+    since the sensor reaches 200 m and a saturated value would be a wrong range.
+    Nodata pixels map to 65535 and back. u16_mm input is stored as is, so only
+    it round-trips exactly.
+    """
+    name = "png16_mm"
+    NODATA_MM = DEPTH_NODATA_MM
+
+    def __init__(self, quality: int = -1):
+        super().__init__(quality)
+        if cv2 is None:
+            raise ImportError("The 'png16_mm' codec requires OpenCV (cv2)")
+
+    def encode(self, frame: np.ndarray):
+        if frame.dtype == np.uint16:
+            mm = frame
+        else:
+            frame = frame.astype(np.float32, copy=False)
+            mm = np.multiply(frame, 10.0, dtype=np.float32)
+            over_range = mm > self.NODATA_MM - 1  # includes nodata and f16_cm's +inf
+            np.clip(mm, 0.0, self.NODATA_MM - 1, out=mm)
+            mm = np.rint(mm, out=mm).astype(np.uint16)
+            mm[over_range] = self.NODATA_MM
+        ok, buf = cv2.imencode(".png", mm, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise ValueError("cv2.imencode failed for png16_mm")
+        return buf
+
+    def decode(self, payload, header: FrameHeader) -> np.ndarray:
+        mm = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if header.dtype == np.uint16:
+            return mm
+        depth = np.multiply(mm, 0.1, dtype=np.float32)
+        depth[mm == self.NODATA_MM] = DEPTH_NODATA_CM if header.dtype == np.float32 else np.inf
+        return depth.astype(header.dtype, copy=False)
+
+
+class DepthF16ZstdCodec(FrameCodec):
+    """Depth as zstd-compressed 16-bit values.
+
+    f32_cm input is narrowed to float16 (relative error <= 2^-11); its nodata
+    sentinel overflows to +inf and is restored on decode. f16_cm and u16_mm
+    input is already 16-bit and goes through losslessly.
+    `quality` is the zstd level (default 1).
+    """
+    name = "f16_zstd"
+
+    def __init__(self, quality: int = -1):
+        super().__init__(quality)
+        if zstandard is None:
+            raise ImportError("The 'f16_zstd' codec requires the zstandard package")
+        self.compressor = zstandard.ZstdCompressor(level=quality if quality > 0 else 1)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, frame: np.ndarray):
+        if frame.dtype.itemsize == 2:
+            return self.compressor.compress(frame)
+        with np.errstate(over="ignore"):
+            half = frame.astype(np.float16)
+        return self.compressor.compress(half)
+
+    def decode(self, payload, header: FrameHeader) -> np.ndarray:
+        data = self.decompressor.decompress(payload)
+        if np.dtype(header.dtype).itemsize == 2:
+            return np.frombuffer(data, dtype=header.dtype).reshape(header.shape)
+        depth = np.frombuffer(data, dtype=np.float16).astype(np.float32).reshape(header.shape)
+        depth[np.isinf(depth)] = DEPTH_NODATA_CM
+        return depth
+
+
+# Codec IDs carried in the header
+CODEC_IDS = {
+    "raw": 0,
+    "jpeg": 1,
+    "webp": 2,
+    "png": 3,
+    "png16_mm": 4,
+    "f16_zstd": 5,
+}
+CODEC_NAMES = {v: k for k, v in CODEC_IDS.items()}
+
+# Codecs whose `quality` trades fidelity for size (see ImagePublisher.set_quality)
+LOSSY_CODECS = ("jpeg", "webp")
+
+# Codecs each stream accepts
+STREAM_CODECS = {
+    "RGB": ("raw", "jpeg", "webp", "png"),
+    "DEPTH": ("raw", "png16_mm", "f16_zstd"),
+    "POINTS": ("raw",),
+}
+
+
+def make_codec(name: str, quality: int = -1) -> FrameCodec:
+    """Build a codec by name; `quality` < 0 picks the codec default."""
+    if name == "raw":
+        return FrameCodec(quality)
+    elif name in CvImageCodec.extensions:
+        return CvImageCodec(name, quality)
+    elif name == DepthPng16Codec.name:
+        return DepthPng16Codec(quality)
+    elif name == DepthF16ZstdCodec.name:
+        return DepthF16ZstdCodec(quality)
+    raise ValueError(f"Unknown codec '{name}', expected one of {tuple(CODEC_IDS)}")
+
+
+def send_frame_multipart(socket: zmq.Socket, header: bytes, frame,
+                         flags: int = zmq.NOBLOCK, track: bool = False,
+                         projection: Optional[np.ndarray] = None) -> Optional[zmq.MessageTracker]:
+    """Send `header` and `frame` as a multipart message without copying the pixels.
+
+    `frame` is either an ndarray or an already-encoded bytes-like payload.
+    If `projection` is given it is appended as a third frame of float64 values.
+
+    The pixel frame references the ndarray memory directly, so the caller must
+    not write into `frame` until ZMQ is done with it. Pass `track=True` and
+    wait on the returned tracker when the buffer is going to be reused.
+
+    Returns:
+        Optional[zmq.MessageTracker]: tracker for the pixel frame if `track` is set
+    """
+    if isinstance(frame, np.ndarray) and not frame.flags['C_CONTIGUOUS']:
+        frame = np.ascontiguousarray(frame)
+    parts = [header, frame]
+    if projection is not None:
+        parts.append(np.ascontiguousarray(projection, dtype=np.float64))
+    tracker = socket.send_multipart(parts, flags=flags, copy=False, track=track)
+    return tracker if track else None
+
+
+def recv_frame_multipart(socket: zmq.Socket, flags: int = 0) -> Tuple[FrameHeader, np.ndarray, Optional[np.ndarray]]:
+    """Receive a frame sent by `send_frame_multipart`.
+
+    Both the binary header and the legacy ASCII header are accepted; legacy
+    frames come back with the metadata fields zeroed. For raw frames the
+    returned array is a read-only view over the received ZMQ message, so no
+    pixel data is copied. Copy it if it has to outlive the next receive or be
+    modified in place. Compressed frames are decoded into a new array.
+
+    Returns:
+        Tuple[FrameHeader, np.ndarray, Optional[np.ndarray]]: header, the HxW or
+            HxWxC pixel view, and the flattened projection matrix if one was sent
+    """
+    parts = socket.recv_multipart(flags=flags, copy=False)
+    header_buf, data_frame = parts[0].buffer, parts[1]
+    if header_buf[:len(HEADER_MAGIC)] == HEADER_MAGIC:
+        header = FrameHeader.unpack(header_buf)
+    else:
+        frame_type, height, width, channels = parse_legacy_header(parts[0].bytes)
+        dtype = np.dtype(FRAME_DTYPES[frame_type])
+        header = FrameHeader(frame_type, dtype, height, width, channels,
+                             width * channels * dtype.itemsize, payload_bytes=len(data_frame))
+
+    pixels = payload_to_pixels(header, data_frame.buffer)
+    projection = np.frombuffer(parts[2].buffer, dtype=np.float64) if len(parts) > 2 else None
+    return header, pixels, projection
+
+
+def payload_to_pixels(header: FrameHeader, payload) -> np.ndarray:
+    """Read-only view over a raw payload, or a freshly decoded array for other codecs."""
+    if header.codec != "raw":
+        return _decoder(header.codec).decode(payload, header)
+    itemsize = np.dtype(header.dtype).itemsize
+    strides = (header.row_stride, header.channels * itemsize, itemsize)[:len(header.shape)]
+    pixels = np.ndarray(header.shape, dtype=header.dtype, buffer=payload, strides=strides)
+    pixels.flags.writeable = False
+    return pixels
+
+
+_decoders = {}
+
+def _decoder(name: str) -> FrameCodec:
+    """Decoders are stateless apart from their setup, so keep one per codec."""
+    if name not in _decoders:
+        _decoders[name] = make_codec(name)
+    return _decoders[name]
+
+
+#############################
+# Shared-memory frame ring (same-host transport)
+####################
+# Ring layout: ring header, then `slots` slots of SLOT_HEADER_SIZE + slot_bytes.
+#   ring header: magic 4s | slots I | slot_bytes Q  (padded to 64 bytes)
+#   slot header: seq Q | FrameHeader                (padded to 128 bytes)
+# Each slot is guarded by a seqlock: the writer makes `seq` odd while it
+# writes and even once the slot is complete, so readers can detect torn or
+# overwritten frames by comparing `seq` before and after they use the data.
+RING_MAGIC = b"STRG"
+_RING_STRUCT = struct.Struct("<4sIQ")
+RING_HEADER_SIZE = 64
+_SLOT_SEQ = struct.Struct("<Q")
+SLOT_HEADER_SIZE = 128
+
+# Notification sent over ZMQ per frame: magic | slot | seq | ring name (utf-8)
+NOTIFY_MAGIC = b"STRN"
+_NOTIFY_STRUCT = struct.Struct("<4sIQ")
+
+# Rings created by this process (see the resource tracker note in ShmFrameRing)
+_owned_rings = set()
+
+
+class ShmFrameRing:
+    """Ring of frame slots in shared memory, written by ImagePublisher and read by subscribers."""
+
+    def __init__(self, name: str, slots: int = 0, slot_bytes: int = 0, create: bool = False):
+        """Create (publisher) or attach to (subscriber) the ring called `name`.
+
+        Args:
+            name (str): Shared-memory segment name
+            slots (int): Number of slots (create only)
+            slot_bytes (int): Payload capacity of each slot (create only)
+            create (bool): Create the segment instead of attaching to it
+        """
+        self.name = name
+        self.owner = create
+        if create:
+            slot_bytes = -(-slot_bytes // 64) * 64  # keep every payload 64-byte aligned
+            size = RING_HEADER_SIZE + slots * (SLOT_HEADER_SIZE + slot_bytes)
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a publisher that didn't shut down cleanly
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _owned_rings.add(name)
+            _RING_STRUCT.pack_into(self.shm.buf, 0, RING_MAGIC, slots, slot_bytes)
+            for slot in range(slots):
+                _SLOT_SEQ.pack_into(self.shm.buf, RING_HEADER_SIZE + slot * (SLOT_HEADER_SIZE + slot_bytes), 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if os.name == "posix" and name not in _owned_rings:
+                # Attaching registers the segment with this process's resource
+                # tracker, which would unlink it on exit; only the owner should
+                try:
+                    from multiprocessing import resource_tracker
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+                except Exception:
+                    pass
+            magic, slots, slot_bytes = _RING_STRUCT.unpack_from(self.shm.buf, 0)
+            if magic != RING_MAGIC:
+                raise ValueError(f"Shared memory '{name}' is not a frame ring")
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._next_slot = 0
+        self._seq = 0
+
+    def _slot_offset(self, slot: int) -> int:
+        return RING_HEADER_SIZE + slot * (SLOT_HEADER_SIZE + self.slot_bytes)
+
+    def write(self, header: FrameHeader, payload) -> Tuple[int, int]:
+        """Copy a frame into the next slot.
+
+        Returns:
+            Tuple[int, int]: slot index and the (even) sequence that marks it complete
+        """
+        data = memoryview(payload).cast("B")
+        if data.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {data.nbytes} bytes does not fit {self.slot_bytes}-byte ring slots")
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.slots
+        self._seq += 2
+        off = self._slot_offset(slot)
+        buf = self.shm.buf
+
+        _SLOT_SEQ.pack_into(buf, off, self._seq - 1)  # odd: write in progress
+        buf[off + _SLOT_SEQ.size:off + _SLOT_SEQ.size + HEADER_SIZE] = header.pack()
+        data_off = off + SLOT_HEADER_SIZE
+        buf[data_off:data_off + data.nbytes] = data
+        _SLOT_SEQ.pack_into(buf, off, self._seq)  # even: complete
+        return slot, self._seq
+
+    def slot_seq(self, slot: int) -> int:
+        return _SLOT_SEQ.unpack_from(self.shm.buf, self._slot_offset(slot))[0]
+
+    def read(self, slot: int, seq: int) -> Optional[Tuple[FrameHeader, np.ndarray]]:
+        """Return the header and pixels of `slot` if it still holds frame `seq`.
+
+        Raw frames come back as a read-only view into shared memory; check
+        `is_valid(slot, seq)` after using it, since the writer reuses the slot
+        `slots` frames later. Returns None if the frame was already overwritten.
+        """
+        if self.slot_seq(slot) != seq:
+            return None
+        off = self._slot_offset(slot)
+        header = FrameHeader.unpack(self.shm.buf[off + _SLOT_SEQ.size:off + _SLOT_SEQ.size + HEADER_SIZE])
+        data_off = off + SLOT_HEADER_SIZE
+        pixels = payload_to_pixels(header, self.shm.buf[data_off:data_off + header.payload_bytes])
+        if self.slot_seq(slot) != seq:
+            return None
+        return header, pixels
+
+    def is_valid(self, slot: int, seq: int) -> bool:
+        return self.slot_seq(slot) == seq
+
+    def close(self) -> None:
+        """Detach; the owner also removes the segment."""
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views handed out by read() are still alive; the mapping goes with the process
+            pass
+        if self.owner:
+            self.shm.unlink()
+            _owned_rings.discard(self.name)
+
+
+def pack_shm_notification(ring_name: str, slot: int, seq: int) -> bytes:
+    return _NOTIFY_STRUCT.pack(NOTIFY_MAGIC, slot, seq) + ring_name.encode("utf-8")
+
+
+def unpack_shm_notification(msg) -> Tuple[str, int, int]:
+    """Returns:
+        Tuple[str, int, int]: ring name, slot, sequence
+    """
+    magic, slot, seq = _NOTIFY_STRUCT.unpack_from(msg)
+    if magic != NOTIFY_MAGIC:
+        raise ValueError(f"Bad shm notification magic {magic!r}")
+    return bytes(msg[_NOTIFY_STRUCT.size:]).decode("utf-8"), slot, seq
+
+
+class ShmFrameSubscriber:
+    """Subscriber helper for ImagePublisher's shm transport.
+
+    Example:
+        sub = ShmFrameSubscriber("127.0.0.1", 55556)
+        while True:
+            frame = sub.recv()
+            if frame is None:
+                continue  # overwritten before we got to it
+            header, pixels = frame
+            ...  # use pixels
+            if not sub.still_valid():
+                ...  # publisher lapped us while we were using the view
+
+    Pass `conflate=False` when the port carries more than one stream (RGB and
+    depth on one port), or a depth notification will displace the RGB one
+    before it; ImageSubscriber then conflates per stream itself.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 55556, context: Optional[zmq.Context] = None,
+                 conflate: bool = True):
+        self.context = context or zmq.Context.instance()
+        self.socket = self.context.socket(zmq.SUB)
+        if conflate:
+            self.socket.setsockopt(zmq.CONFLATE, 1)  # notifications are single-part, keep only the newest
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"")
+        self.socket.connect(f"tcp://{host}:{port}")
+        self.rings = {}
+        self._last = None
+
+    def _ring(self, name: str) -> ShmFrameRing:
+        ring = self.rings.get(name)
+        if ring is None:
+            # The publisher starts a new ring when frames outgrow the old one
+            for old in self.rings.values():
+                old.close()
+            self.rings = {name: ShmFrameRing(name)}
+            ring = self.rings[name]
+        return ring
+
+    def recv(self, flags: int = 0) -> Optional[Tuple[FrameHeader, np.ndarray]]:
+        """Wait for the next notification and return that frame, or None if it was already overwritten."""
+        name, slot, seq = unpack_shm_notification(self.socket.recv(flags=flags, copy=False).buffer)
+        ring = self._ring(name)
+        self._last = (ring, slot, seq)
+        return ring.read(slot, seq)
+
+    def still_valid(self) -> bool:
+        """Whether the view returned by the last `recv` has not been overwritten yet."""
+        if self._last is None:
+            return False
+        ring, slot, seq = self._last
+        return ring.is_valid(slot, seq)
+
+    def last_slot(self) -> Optional[Tuple[ShmFrameRing, int, int]]:
+        """(ring, slot, seq) of the last `recv`, to check that frame later with `ring.is_valid(slot, seq)`."""
+        return self._last
+
+    def close(self) -> None:
+        self.socket.close(0)
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+
+
+#############################
+# Receiver acknowledgements (optional)
+####################
+# Subscribers that want the publisher to adapt to them PUSH one small message
+# per frame they actually consume: magic 4s | stream B | pad 3 | sequence Q
+ACK_MAGIC = b"SACK"
+_ACK_STRUCT = struct.Struct("<4sB3xQ")
+
+
+def pack_ack(stream: str, sequence: int) -> bytes:
+    return _ACK_STRUCT.pack(ACK_MAGIC, STREAM_IDS[stream], sequence)
+
+
+def unpack_ack(msg) -> Tuple[str, int]:
+    """Returns:
+        Tuple[str, int]: stream, sequence
+    """
+    magic, stream, sequence = _ACK_STRUCT.unpack_from(msg)
+    if magic != ACK_MAGIC:
+        raise ValueError(f"Bad ack magic {magic!r}")
+    return STREAM_NAMES[stream], sequence
+
+
+#############################
+# Per-frame latency tracing
+####################
+# Bucket upper edges (ms) shared by every histogram: log-spaced, 0.05 ms to 10 s.
+LATENCY_BUCKETS_MS = np.geomspace(0.05, 10_000.0, 97).tolist()
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; recording is a bisect and an increment."""
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # last bucket: beyond 10 s
+        self.total = 0
+        self.max_ms = 0.0
+
+    def record(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float:
+        """Upper edge (ms) of the bucket holding the q-th percentile (0-100); 0.0 if empty."""
+        if not self.total:
+            return 0.0
+        target = q / 100.0 * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+# Trace points in pipeline order; each stage is the time between consecutive points.
+TRACE_POINTS = ("requested", "callback", "converted", "encoded", "sent")
+
+
+class FrameTrace:
+    """perf_counter() timestamps for one frame as it moves through the pipeline (None = not reached)."""
+    __slots__ = TRACE_POINTS
+
+    def __init__(self, **points: float):
+        for name in TRACE_POINTS:
+            setattr(self, name, points.get(name))
+
+    def mark(self, point: str) -> None:
+        setattr(self, point, time.perf_counter())
+
+
+class LatencyTracer:
+    """Rolls FrameTraces into per-stream, per-stage histograms.
+
+    Stages are named "<from>-><to>" for consecutive trace points, plus "total"
+    from the first to the last point present. Thread safe; `report()` returns
+    the window's p50/p95/p99 and starts a new window.
+    """
+    def __init__(self):
+        self._hists = {}  # stream -> stage -> LatencyHistogram
+        self._lock = threading.Lock()
+
+    def record(self, stream: str, trace: FrameTrace) -> None:
+        points = [(name, getattr(trace, name)) for name in TRACE_POINTS if getattr(trace, name) is not None]
+        if len(points) < 2:
+            return
+        with self._lock:
+            hists = self._hists.setdefault(stream, {})
+            for (a, ta), (b, tb) in zip(points, points[1:]):
+                hists.setdefault(f"{a}->{b}", LatencyHistogram()).record((tb - ta) * 1000)
+            hists.setdefault("total", LatencyHistogram()).record((points[-1][1] - points[0][1]) * 1000)
+
+    def snapshot(self) -> dict:
+        """{stream: {stage: {"count", "p50_ms", "p95_ms", "p99_ms", "max_ms"}}} for the current window."""
+        with self._lock:
+            return {
+                stream: {
+                    stage: {"count": h.total, "p50_ms": h.percentile(50), "p95_ms": h.percentile(95),
+                            "p99_ms": h.percentile(99), "max_ms": h.max_ms}
+                    for stage, h in hists.items()
+                }
+                for stream, hists in self._hists.items()
+            }
+
+    def report(self) -> dict:
+        snap = self.snapshot()
+        with self._lock:
+            self._hists = {}
+        return snap
+
+
+def format_latency_report(snap: dict) -> str:
+    lines = []
+    for stream, stages in snap.items():
+        parts = [f"{stage} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}/{s['p99_ms']:.1f}" for stage, s in stages.items()]
+        count = stages.get("total", {}).get("count", 0)
+        lines.append(f"{stream} ({count} frames, p50/p95/p99 ms): " + ", ".join(parts))
+    return "; ".join(lines)
@@ -0,0 +1,97 @@
+"""
+Depth image -> XYZ point cloud, for ImageSender's optional POINTS stream.
+
+Points are float32 metres in the camera optical frame (x right, y down,
+z forward), packed as consecutive x, y, z: the layout of a PointCloud2 with
+POINTCLOUD2_FIELDS, point_step 12, height 1 and width N.
+
+Like ImageTransport, nothing here talks to the simulator.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ImageTransport import DEPTH_UNITS, depth_nodata
+
+# sensor_msgs/PointField entries: name, offset, datatype (7 = FLOAT32), count
+POINTCLOUD2_FIELDS = (("x", 0, 7, 1), ("y", 4, 7, 1), ("z", 8, 7, 1))
+POINT_STEP = 12
+
+_UNIT_TO_M = {"cm": 0.01, "mm": 0.001, "m": 1.0}
+
+
+def ray_grid(width: int, height: int, projection: Optional[np.ndarray] = None,
+             fov_deg: Optional[float] = None) -> np.ndarray:
+    """Per-pixel camera rays scaled to z = 1, as an HxWx3 float32 array.
+
+    Focal lengths come from the 4x4 perspective `projection` (P[0][0] and
+    P[1][1], the NDC focal lengths), or from the horizontal `fov_deg` when no
+    usable matrix is given. The principal point is assumed to be the image
+    centre, as for the simulator's symmetric camera frustum.
+    """
+    fx = fy = 0.0
+    if projection is not None:
+        p = np.asarray(projection, dtype=np.float64).reshape(4, 4)
+        fx, fy = abs(p[0, 0]), abs(p[1, 1])
+    if not (fx > 0 and fy > 0):
+        if fov_deg is None:
+            raise ValueError("Need a perspective projection matrix or a FOV to build camera rays")
+        fx = 1.0 / np.tan(np.radians(fov_deg) / 2)
+        fy = fx * width / height
+    # Pixel centres in NDC; image rows grow downwards like the optical frame's y
+    x = ((np.arange(width, dtype=np.float32) + 0.5) * (2.0 / width) - 1.0) / fx
+    y = ((np.arange(height, dtype=np.float32) + 0.5) * (2.0 / height) - 1.0) / fy
+    rays = np.empty((height, width, 3), dtype=np.float32)
+    rays[:, :, 0] = x[None, :]
+    rays[:, :, 1] = y[:, None]
+    rays[:, :, 2] = 1.0
+    return rays
+
+
+def voxel_downsample(points: np.ndarray, voxel_m: float) -> np.ndarray:
+    """Replace the points in each `voxel_m` cube by their centroid (Nx3 float32 in, Mx3 out)."""
+    if voxel_m <= 0 or len(points) == 0:
+        return points
+    cells = np.floor(points / voxel_m).astype(np.int64)
+    cells -= cells.min(axis=0)
+    # One sortable key per cell (21 bits per axis covers ~2M voxels per side)
+    keys = (cells[:, 0] << 42) | (cells[:, 1] << 21) | cells[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    out = np.empty((len(counts), 3), dtype=np.float32)
+    for axis in range(3):
+        out[:, axis] = np.bincount(inverse, weights=points[:, axis], minlength=len(counts)) / counts
+    return out
+
+
+class DepthProjector:
+    """Back-projects depth images through a cached ray grid.
+
+    The grid is rebuilt only when the resolution or projection (i.e. FOV) changes,
+    so each frame costs one masked multiply.
+    """
+    def __init__(self, voxel_m: float = 0.0):
+        self.voxel_m = voxel_m
+        self._rays: Dict[Tuple, np.ndarray] = {}
+
+    def rays(self, width: int, height: int, projection: Optional[np.ndarray] = None,
+             fov_deg: Optional[float] = None) -> np.ndarray:
+        p = None if projection is None else np.asarray(projection, dtype=np.float64).reshape(-1)
+        key = (width, height, None if p is None else p.tobytes(), fov_deg)
+        rays = self._rays.get(key)
+        if rays is None:
+            if len(self._rays) >= 4:
+                self._rays.clear()  # keep only recent camera setups
+            rays = self._rays[key] = ray_grid(width, height, p, fov_deg)
+        return rays
+
+    def project(self, depth: np.ndarray, projection: Optional[np.ndarray] = None,
+                fov_deg: Optional[float] = None) -> np.ndarray:
+        """Nx3 float32 XYZ (m) for the valid pixels of an HxW depth image in any DEPTH_FORMATS format."""
+        height, width = depth.shape
+        rays = self.rays(width, height, projection, fov_deg)
+        scale = _UNIT_TO_M[DEPTH_UNITS[depth.dtype]]
+        valid = depth < depth_nodata(depth.dtype)
+        z = depth[valid].astype(np.float32)
+        points = rays[valid]
+        np.multiply(points, (z * scale)[:, None], out=points)
+        return voxel_downsample(points, self.voxel_m)
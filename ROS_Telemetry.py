@@ -13,9 +13,16 @@ import numpy as np
 st.OnScreenLogMessage("ROS_Telemetry started properly.", "ROS_Telemetry", st.Severity.Info)
 
 import json
+from typing import List, Optional
+
 import roslibpy
 import cv2
 
+from Scheduling import RateScheduler
+from SimTime import sim_time_to_ns
+from Telemetry import (ODOMETRY_ENCODINGS, FrameTransform, OdometrySample, VelocityEstimator, odometry_msg,
+                       pack_odometry, packed_odometry_msg)
+
 
 st.logger_info("Starting ROS Communication Server...")
 
@@ -46,96 +53,173 @@ marsFrame = mars.GetBodyFixedFrame()
 local: st.Entity = this.GetParam(st.VarType.entityRef, "LocalFrame")
 localFrame = local.GetBodyFixedFrame()
 
+class TelemetrySampler:
+    """Reads the entity's location and rotation once per tick and derives its pose and velocity in both frames.
+
+    Only the Mars-frame conversion is done by the sim every tick. The local frame is
+    fixed to Mars, so local poses come from a cached FrameTransform, refit every
+    `refresh_s` from a direct conversion that also checks the cached one (0 = fit once).
+    If a check fails, every tick is converted directly from then on. Velocities come
+    from a VelocityEstimator per frame over the last `velocity_window_s` of sim time.
+    """
+    def __init__(self, entity: st.Entity, mars_frame, local_frame, refresh_s: float = 1.0,
+                 velocity_window_s: float = 0.2):
+        self.entity = entity
+        self.mars_frame = mars_frame
+        self.local_frame = local_frame
+        self.refresh_s = refresh_s
+        self.transform: Optional[FrameTransform] = None
+        self.direct = False
+        self._next_refresh = 0.0
+        self.estimators = {"mars": VelocityEstimator(velocity_window_s), "local": VelocityEstimator(velocity_window_s)}
+
+    def sample(self, sim_time_ns: int) -> List[OdometrySample]:
+        location = self.entity.getLocation()
+        rotation = self.entity.getRotation()
+        loc_marsFrame = np.asarray(location.WRT_ExprIn(self.mars_frame), dtype=np.float64)
+        rot_marsFrame = np.asarray(rotation.Quat_WRT(self.mars_frame), dtype=np.float64)
+
+        now = time.perf_counter()
+        if self.direct or self.transform is None or (self.refresh_s > 0 and now >= self._next_refresh):
+            loc_localFrame = np.asarray(location.WRT_ExprIn(self.local_frame), dtype=np.float64)
+            rot_localFrame = np.asarray(rotation.Quat_WRT(self.local_frame), dtype=np.float64)
+            if not self.direct:
+                if self.transform is not None and not self.transform.matches(
+                        loc_marsFrame, rot_marsFrame, loc_localFrame, rot_localFrame):
+                    self.direct = True
+                    st.logger_warn("LocalFrame moved relative to Mars; converting telemetry to it every tick")
+                else:
+                    self.transform = FrameTransform.fit(loc_marsFrame, rot_marsFrame, loc_localFrame, rot_localFrame)
+                    self._next_refresh = now + self.refresh_s
+        else:
+            loc_localFrame = self.transform.position(loc_marsFrame)
+            rot_localFrame = self.transform.orientation(rot_marsFrame)
+
+        samples = []
+        for frame_id, position, orientation in (("mars", loc_marsFrame, rot_marsFrame),
+                                                ("local", loc_localFrame, rot_localFrame)):
+            estimator = self.estimators[frame_id]
+            estimator.add(sim_time_ns, position, orientation)
+            linear, angular = estimator.estimate()
+            samples.append(OdometrySample(frame_id, position, orientation, linear, angular))
+        return samples
+
+
+# Local poses go through a cached Mars -> local transform, checked and refit every TransformRefreshS
+sampler = TelemetrySampler(controlled_entity, marsFrame, localFrame,
+                           refresh_s=this.GetParam(st.VarType.double, "TransformRefreshS"),
+                           velocity_window_s=this.GetParam(st.VarType.double, "VelocityWindowS"))
+
 ##################################################### Sensors #####################################################
-location_marsFrame_publisher = roslibpy.Topic(ros, '/LocationMarsFrame', 'geometry_msgs/Point')
-velocity_marsFrame_publisher = roslibpy.Topic(ros, '/VelocityMarsFrame', 'geometry_msgs/Point')
-rotation_marsFrame_publisher = roslibpy.Topic(ros, '/RotationMarsFrame', 'geometry_msgs/Quaternion')
-
-location_localFrame_publisher = roslibpy.Topic(ros, '/LocationLocalFrame', 'geometry_msgs/Point')
-velocity_localFrame_publisher = roslibpy.Topic(ros, '/VelocityLocalFrame', 'geometry_msgs/Point')
-rotation_localFrame_publisher = roslibpy.Topic(ros, '/RotationLocalFrame', 'geometry_msgs/Quaternion')
-
-def publish_location_and_rotation(deltaTime: float):
-    loc_marsFrame = controlled_entity.getLocation().WRT_ExprIn(marsFrame)
-    loc_prev_marsFrame = controlled_entity.GetParam(st.VarType.doubleV3, "LocationMarsFrame")
-    rot_marsFrame = controlled_entity.getRotation().Quat_WRT(marsFrame)
-
-    loc_localFrame = controlled_entity.getLocation().WRT_ExprIn(localFrame)
-    loc_prev_localFrame = controlled_entity.GetParam(st.VarType.doubleV3, "LocationLocalFrame")
-    rot_localFrame = controlled_entity.getRotation().Quat_WRT(localFrame)
-    
-    vel_marsFrame = np.zeros(3)
-    vel_localFrame = np.zeros(3)
-    if deltaTime != 0.0:
-        vel_marsFrame = (loc_prev_marsFrame - loc_marsFrame) / deltaTime
-        vel_localFrame = (loc_prev_localFrame - loc_localFrame) / deltaTime
-
-    location_marsFrame_msg = roslibpy.Message({
-        'x': loc_marsFrame[0],
-        'y': loc_marsFrame[1],
-        'z': loc_marsFrame[2]
-    })
-    
-    velocity_marsFrame_msg = roslibpy.Message({
-        'x': vel_marsFrame[0],
-        'y': vel_marsFrame[1],
-        'z': vel_marsFrame[2]
-    })
-
-    rotation_marsFrame_msg = roslibpy.Message({
-        'x': rot_marsFrame[0],
-        'y': rot_marsFrame[1],
-        'z': rot_marsFrame[2],
-        'w': rot_marsFrame[3]
-    })
-
-    location_localFrame_msg = roslibpy.Message({
-        'x': loc_localFrame[0],
-        'y': loc_localFrame[1],
-        'z': loc_localFrame[2]
-    })
-    
-    velocity_localFrame_msg = roslibpy.Message({
-        'x': vel_localFrame[0],
-        'y': vel_localFrame[1],
-        'z': vel_localFrame[2]
-    })
-
-    rotation_localFrame_msg = roslibpy.Message({
-        'x': rot_localFrame[0],
-        'y': rot_localFrame[1],
-        'z': rot_localFrame[2],
-        'w': rot_localFrame[3]
-    })
-
-    controlled_entity.SetParam(st.VarType.doubleV3, "LocationMarsFrame", loc_marsFrame)
-    controlled_entity.SetParam(st.VarType.doubleV3, "LocationLocalFrame", loc_localFrame)
+# The original six per-frame Point/Quaternion topics
+legacy_topics = this.GetParam(st.VarType.bool, "LegacyTopics")
+if legacy_topics:
+    location_marsFrame_publisher = roslibpy.Topic(ros, '/LocationMarsFrame', 'geometry_msgs/Point')
+    velocity_marsFrame_publisher = roslibpy.Topic(ros, '/VelocityMarsFrame', 'geometry_msgs/Point')
+    rotation_marsFrame_publisher = roslibpy.Topic(ros, '/RotationMarsFrame', 'geometry_msgs/Quaternion')
+
+    location_localFrame_publisher = roslibpy.Topic(ros, '/LocationLocalFrame', 'geometry_msgs/Point')
+    velocity_localFrame_publisher = roslibpy.Topic(ros, '/VelocityLocalFrame', 'geometry_msgs/Point')
+    rotation_localFrame_publisher = roslibpy.Topic(ros, '/RotationLocalFrame', 'geometry_msgs/Quaternion')
+
+# Consolidated odometry: "json" publishes a nav_msgs/Odometry per frame, "packed" one
+# std_msgs/UInt8MultiArray per tick with both frames (layout in Telemetry.py)
+odometry_encoding = this.GetParam(st.VarType.string, "Odometry")
+if odometry_encoding not in ODOMETRY_ENCODINGS:
+    raise ValueError(f"Unknown Odometry encoding '{odometry_encoding}', expected one of {ODOMETRY_ENCODINGS}")
+odometry_publishers = {}
+if odometry_encoding == "json":
+    odometry_publishers = {
+        "mars": roslibpy.Topic(ros, '/OdometryMarsFrame', 'nav_msgs/Odometry'),
+        "local": roslibpy.Topic(ros, '/OdometryLocalFrame', 'nav_msgs/Odometry'),
+    }
+elif odometry_encoding == "packed":
+    odometry_packed_publisher = roslibpy.Topic(ros, '/OdometryPacked', 'std_msgs/UInt8MultiArray')
+odometry_sequence = 0
+
+
+def publish_odometry(samples: list, sim_time_ns: int):
+    global odometry_sequence
+    odometry_sequence += 1
+    if odometry_encoding == "json":
+        for sample in samples:
+            odometry_publishers[sample.frame_id].publish(roslibpy.Message(odometry_msg(sample, sim_time_ns)))
+    else:
+        payload = pack_odometry(samples, sim_time_ns, odometry_sequence)
+        odometry_packed_publisher.publish(roslibpy.Message(packed_odometry_msg(payload)))
+
+
+def publish_location_and_rotation(sim_time_ns: int):
+    samples = sampler.sample(sim_time_ns)
+    mars_sample, local_sample = samples
+    loc_marsFrame, rot_marsFrame = mars_sample.position, mars_sample.orientation
+    loc_localFrame, rot_localFrame = local_sample.position, local_sample.orientation
+    # The legacy /Velocity*Frame topics have always carried (previous - current) / dt, i.e. the
+    # negated velocity; existing consumers rely on that, so only the odometry topics get the true sign
+    vel_marsFrame, vel_localFrame = -mars_sample.linear, -local_sample.linear
 
     try:
-        location_marsFrame_publisher.publish(location_marsFrame_msg)
-        velocity_marsFrame_publisher.publish(velocity_marsFrame_msg)
-        rotation_marsFrame_publisher.publish(rotation_marsFrame_msg)
-        location_localFrame_publisher.publish(location_localFrame_msg)
-        velocity_localFrame_publisher.publish(velocity_localFrame_msg)
-        rotation_localFrame_publisher.publish(rotation_localFrame_msg)
+        if legacy_topics:
+            location_marsFrame_msg = roslibpy.Message({
+                'x': loc_marsFrame[0],
+                'y': loc_marsFrame[1],
+                'z': loc_marsFrame[2]
+            })
+
+            velocity_marsFrame_msg = roslibpy.Message({
+                'x': vel_marsFrame[0],
+                'y': vel_marsFrame[1],
+                'z': vel_marsFrame[2]
+            })
+
+            rotation_marsFrame_msg = roslibpy.Message({
+                'x': rot_marsFrame[0],
+                'y': rot_marsFrame[1],
+                'z': rot_marsFrame[2],
+                'w': rot_marsFrame[3]
+            })
+
+            location_localFrame_msg = roslibpy.Message({
+                'x': loc_localFrame[0],
+                'y': loc_localFrame[1],
+                'z': loc_localFrame[2]
+            })
+
+            velocity_localFrame_msg = roslibpy.Message({
+                'x': vel_localFrame[0],
+                'y': vel_localFrame[1],
+                'z': vel_localFrame[2]
+            })
+
+            rotation_localFrame_msg = roslibpy.Message({
+                'x': rot_localFrame[0],
+                'y': rot_localFrame[1],
+                'z': rot_localFrame[2],
+                'w': rot_localFrame[3]
+            })
+
+            location_marsFrame_publisher.publish(location_marsFrame_msg)
+            velocity_marsFrame_publisher.publish(velocity_marsFrame_msg)
+            rotation_marsFrame_publisher.publish(rotation_marsFrame_msg)
+            location_localFrame_publisher.publish(location_localFrame_msg)
+            velocity_localFrame_publisher.publish(velocity_localFrame_msg)
+            rotation_localFrame_publisher.publish(rotation_localFrame_msg)
+        if odometry_encoding != "none":
+            publish_odometry(samples, sim_time_ns)
     except Exception as e:
         st.logger_error(f"Error publishing location/rotation to ROS: {str(e)}")
 
 
-t0: st.timestamp = st.SimGlobals.SimClock.GetTimeNow()
+# Ticks on perf_counter deadlines; every sample is stamped with SimClock time, which velocities are taken against
+scheduler = RateScheduler({"odometry": lambda: this.GetParam(st.VarType.double, "LoopFreqHz")},
+                          refresh_s=this.GetParam(st.VarType.double, "RateRefreshS"),
+                          label="Telemetry rate", log=st.logger_info)
 
 exit_flag = False
 while not exit_flag:
-    # dt
+    if not scheduler.wait():
+        continue
     t_now: st.timestamp = st.SimGlobals.SimClock.GetTimeNow()
-    dt: datetime.timedelta = t_now.as_datetime() - t0.as_datetime()
-    dt_sim: float = dt.total_seconds()
-    dt_irl: float = 1.0 / st.GetThisSystem().GetParam(st.VarType.double, "LoopFreqHz")
-
-    time.sleep(dt_irl)
-
-    publish_location_and_rotation(dt_sim)
-
-    t0 = t_now
+    publish_location_and_rotation(sim_time_to_ns(t_now))
 
 st.leave_sim()
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Deadline scheduling shared by the sim scripts' main loops.
+
+ImageSender fires each camera stream and ROS_Telemetry its telemetry tick off
+the same perf_counter deadlines; ImageSender's adaptive mode scales those rates
+down under backpressure. Nothing here touches spaceteams, so it imports without
+a running sim; the scripts pass `st.logger_info` as the log.
+"""
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+_logger = logging.getLogger("Scheduling")
+
+
+class StreamSchedule:
+    """Monotonic deadline for one periodic stream.
+
+    Deadlines advance by exactly one period per firing, so time spent in the loop
+    doesn't accumulate as drift. If the loop falls more than a period behind, the
+    missed ticks are skipped (counted in `missed`) instead of fired back to back.
+    A tick whose work outlasts a period is counted in `overruns`.
+    """
+    def __init__(self, name: str, freq_hz: float, now: float):
+        self.name = name
+        self.period = 0.0
+        self.next_deadline = now
+        self.last_fire: Optional[float] = None
+        self._in_tick = False  # fired and not yet back in the scheduler's wait
+        self.set_rate(freq_hz, now)
+
+        # Stats since the last report
+        self.fired = 0
+        self.missed = 0
+        self.overruns = 0
+        self.lateness_sum = 0.0
+        self.lateness_max = 0.0
+
+    def set_rate(self, freq_hz: float, now: float) -> None:
+        """Change the rate; a non-positive rate disables the stream."""
+        period = 1.0 / freq_hz if freq_hz > 0 else 0.0
+        if period == self.period:
+            return
+        self.period = period
+        if period > 0:
+            self.next_deadline = (self.last_fire + period) if self.last_fire is not None else now
+
+    def due(self, now: float) -> bool:
+        return self.period > 0 and now >= self.next_deadline
+
+    def fire(self, now: float) -> None:
+        lateness = now - self.next_deadline
+        self.fired += 1
+        self.lateness_sum += lateness
+        self.lateness_max = max(self.lateness_max, lateness)
+        self.last_fire = now
+        self._in_tick = True
+        self.next_deadline += self.period
+        if self.next_deadline <= now:
+            skipped = int((now - self.next_deadline) // self.period) + 1
+            self.missed += skipped
+            self.next_deadline += skipped * self.period
+
+    def tick_done(self, now: float) -> None:
+        """Close the tick fired last; counts an overrun if its work took longer than a period."""
+        if self._in_tick and self.period > 0 and now - self.last_fire > self.period:
+            self.overruns += 1
+        self._in_tick = False
+
+    def reset_stats(self) -> None:
+        self.fired = 0
+        self.missed = 0
+        self.overruns = 0
+        self.lateness_sum = 0.0
+        self.lateness_max = 0.0
+
+
+class RateScheduler:
+    """Fires each stream at its target rate off perf_counter deadlines.
+
+    Rates come from `rate_sources` (stream -> callable returning Hz), which are only
+    polled every `refresh_s` rather than on every tick. Achieved rate, jitter
+    (lateness past the deadline), misses and overruns are logged every
+    `report_period_s`, prefixed with `label`.
+    """
+    def __init__(self, rate_sources: Dict[str, Callable[[], float]], max_sleep_s: float = 0.1,
+                 refresh_s: float = 1.0, report_period_s: float = 5.0, label: str = "Rates",
+                 log: Optional[Callable[[str], None]] = None):
+        now = time.perf_counter()
+        self.rate_sources = rate_sources
+        self.max_sleep_s = max_sleep_s
+        self.refresh_s = refresh_s
+        self.report_period_s = report_period_s
+        self.label = label
+        self.log = log if log is not None else _logger.info
+        self.streams = {name: StreamSchedule(name, source(), now) for name, source in rate_sources.items()}
+        self._next_refresh = now + refresh_s
+        self._last_report = now
+
+    def refresh_rates(self, now: Optional[float] = None) -> None:
+        now = time.perf_counter() if now is None else now
+        for name, source in self.rate_sources.items():
+            self.streams[name].set_rate(source(), now)
+        self._next_refresh = now + self.refresh_s
+
+    def wait(self) -> list:
+        """Sleep until the next deadline (at most `max_sleep_s`) and return the streams that are due."""
+        now = time.perf_counter()
+        for schedule in self.streams.values():
+            schedule.tick_done(now)
+        deadlines = [s.next_deadline for s in self.streams.values() if s.period > 0]
+        wake = min(deadlines + [self._next_refresh, now + self.max_sleep_s])
+        if wake > now:
+            time.sleep(wake - now)
+            now = time.perf_counter()
+
+        if now >= self._next_refresh:
+            self.refresh_rates(now)
+        if now - self._last_report >= self.report_period_s:
+            self.report(now)
+
+        due = []
+        for schedule in self.streams.values():
+            if schedule.due(now):
+                schedule.fire(now)
+                due.append(schedule.name)
+        return due
+
+    def report(self, now: Optional[float] = None) -> None:
+        now = time.perf_counter() if now is None else now
+        elapsed = now - self._last_report
+        parts = []
+        for s in self.streams.values():
+            if s.period <= 0:
+                parts.append(f"{s.name}: off")
+                continue
+            mean_ms = s.lateness_sum / s.fired * 1000 if s.fired else 0.0
+            parts.append(f"{s.name}: {s.fired / elapsed:.1f}/{1.0 / s.period:.1f} Hz, "
+                         f"jitter mean {mean_ms:.1f}ms max {s.lateness_max * 1000:.1f}ms, "
+                         f"missed {s.missed}, overruns {s.overruns}")
+            s.reset_stats()
+        self.log(f"{self.label} " + "; ".join(parts))
+        self._last_report = now
+
+
+class RateController:
+    """Adapts each stream's capture rate, and optionally its codec quality, to backpressure.
+
+    Every `window_s`, `counters(stream)` gives cumulative (lost, published, acked)
+    counts: frames lost to backpressure anywhere between capture and socket, frames
+    published, and subscriber ACKs (None when ACKs aren't in use). A window with
+    losses, or with fewer than `min_ack_ratio` of its frames acknowledged, multiplies
+    the stream's rate scale by `decrease` (down to `min_scale`) and lowers its quality
+    by `quality_step` (down to `min_quality`). A clean window first raises the scale by
+    `increase`, then the quality by half a step, back to 1.0 and the stream's entry in
+    `quality_caps`. The scale multiplies the configured rate, which stays the cap.
+    Changes are reported through `log`.
+    """
+    def __init__(self, streams: list, counters: Callable[[str], Tuple[int, int, Optional[int]]],
+                 window_s: float = 2.0, min_scale: float = 0.1, decrease: float = 0.7, increase: float = 0.1,
+                 min_ack_ratio: float = 0.8, quality_caps: Optional[Dict[str, int]] = None,
+                 set_quality: Optional[Callable[[str, int], bool]] = None, quality_step: int = 10,
+                 min_quality: int = 30, log: Optional[Callable[[str], None]] = None):
+        self.counters = counters
+        self.window_s = window_s
+        self.min_scale = min_scale
+        self.decrease = decrease
+        self.increase = increase
+        self.min_ack_ratio = min_ack_ratio
+        self.quality_caps = quality_caps or {}
+        self.set_quality = set_quality
+        self.quality_step = quality_step
+        self.min_quality = min_quality
+        self.log = log if log is not None else _logger.info
+        self.scales: Dict[str, float] = {s: 1.0 for s in streams}
+        self.quality: Dict[str, int] = dict(self.quality_caps) if set_quality is not None else {}
+        self._last = {s: counters(s) for s in streams}
+        self._next_update = time.perf_counter() + window_s
+
+    def scale(self, stream: str) -> float:
+        return self.scales.get(stream, 1.0)
+
+    def update(self) -> None:
+        """Re-evaluate every stream if a window has passed; cheap to call every tick."""
+        now = time.perf_counter()
+        if now < self._next_update:
+            return
+        self._next_update = now + self.window_s
+        for stream, (lost0, published0, acked0) in self._last.items():
+            lost, published, acked = self._last[stream] = self.counters(stream)
+            lost -= lost0
+            published -= published0
+            ack_ratio = None
+            # Streams nobody has ever ACKed are left alone (the subscriber may not consume them)
+            if acked and acked0 is not None and published > 0:
+                ack_ratio = (acked - acked0) / published
+            congested = lost > 0 or (ack_ratio is not None and ack_ratio < self.min_ack_ratio)
+            self._adjust(stream, congested, lost, ack_ratio)
+
+    def _adjust(self, stream: str, congested: bool, lost: int, ack_ratio: Optional[float]) -> None:
+        scale, quality = self.scales[stream], self.quality.get(stream)
+        if congested:
+            scale = max(self.min_scale, scale * self.decrease)
+            if quality is not None:
+                quality = max(self.min_quality, quality - self.quality_step)
+        elif scale < 1.0:
+            scale = min(1.0, scale + self.increase)
+        elif quality is not None:
+            quality = min(self.quality_caps[stream], quality + max(1, self.quality_step // 2))
+        if scale == self.scales[stream] and quality == self.quality.get(stream):
+            return
+        self.scales[stream] = scale
+        msg = f"Adaptive rate {stream}: {scale:.0%} of configured"
+        if quality is not None and self.set_quality is not None and self.set_quality(stream, quality):
+            self.quality[stream] = quality
+            msg += f", quality {quality}"
+        acks = f", {ack_ratio:.0%} acked" if ack_ratio is not None else ""
+        self.log(msg + (f" ({lost} lost{acks})" if congested else ""))
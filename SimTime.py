@@ -0,0 +1,15 @@
+"""
+SimClock timestamp helpers shared by the sim scripts.
+
+Only duck-types spaceteams' timestamps (anything with `as_datetime()`), so it
+imports without a running sim.
+"""
+import datetime
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def sim_time_to_ns(timestamp) -> int:
+    """Convert a SimClock timestamp (st.timestamp) to integer nanoseconds since 1970-01-01 (sim time scale)."""
+    delta = timestamp.as_datetime().replace(tzinfo=None) - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1_000
@@ -0,0 +1,370 @@
+"""
+Message helpers for ROS_Telemetry.
+
+Odometry goes out either as nav_msgs/Odometry dicts (one per reference frame)
+or, packed, as a single std_msgs/UInt8MultiArray per tick holding every frame's
+sample in a fixed little-endian layout (see `pack_odometry`). rosbridge takes
+uint8[] data as base64, so the packed form is a few hundred bytes of JSON
+instead of several kB.
+
+Like ImageTransport, nothing here talks to the simulator.
+"""
+import base64
+import struct
+import threading
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+ODOMETRY_ENCODINGS = ("none", "json", "packed")
+
+# Reference frames telemetry is reported in (ROS frame_id), and their codes in the packed form
+FRAME_IDS = {
+    "mars": 0,
+    "local": 1,
+}
+FRAME_NAMES = {v: k for k, v in FRAME_IDS.items()}
+CHILD_FRAME_ID = "base_link"
+
+_ZERO_COVARIANCE = [0.0] * 36  # unknown; nav_msgs convention would be -1 on the diagonal, but consumers ignore it
+
+
+@dataclass
+class OdometrySample:
+    frame_id: str  # see FRAME_IDS
+    position: np.ndarray  # x, y, z (m)
+    orientation: np.ndarray  # quaternion x, y, z, w
+    linear: np.ndarray  # velocity x, y, z (m/s) in the same frame (odometry_msg rotates it into the body)
+    angular: np.ndarray  # rad/s, same frame
+
+
+def ros_time(ns: int) -> dict:
+    """builtin_interfaces/Time (ROS 2 field names, as SpaceTeamsROS uses) from ns since 1970."""
+    return {"sec": int(ns // 1_000_000_000), "nanosec": int(ns % 1_000_000_000)}
+
+
+def ros_time_to_ns(stamp: dict) -> int:
+    return int(stamp["sec"]) * 1_000_000_000 + int(stamp["nanosec"])
+
+
+def _xyz(v) -> dict:
+    return {"x": float(v[0]), "y": float(v[1]), "z": float(v[2])}
+
+
+def odometry_msg(sample: OdometrySample, sim_time_ns: int) -> dict:
+    """nav_msgs/Odometry for one frame's sample, stamped with SimClock time.
+
+    nav_msgs gives the twist in child_frame_id (the rover body), so the sample's
+    frame-relative velocities are rotated into it by the inverse of the pose's
+    orientation. The packed form keeps them in the parent frame.
+    """
+    q = sample.orientation
+    to_body = quat_to_matrix(q).T
+    return {
+        "header": {"stamp": ros_time(sim_time_ns), "frame_id": sample.frame_id},
+        "child_frame_id": CHILD_FRAME_ID,
+        "pose": {
+            "pose": {
+                "position": _xyz(sample.position),
+                "orientation": {"x": float(q[0]), "y": float(q[1]), "z": float(q[2]), "w": float(q[3])},
+            },
+            "covariance": _ZERO_COVARIANCE,
+        },
+        "twist": {
+            "twist": {"linear": _xyz(to_body @ sample.linear), "angular": _xyz(to_body @ sample.angular)},
+            "covariance": _ZERO_COVARIANCE,
+        },
+    }
+
+
+#############################
+# Packed odometry
+####################
+# Layout (little-endian):
+#   header: magic 4s | version B | sample count B | pad 2 | sim_time_ns q | sequence I | pad 4   (24 bytes)
+#   per sample: frame B | pad 7 | position 3d | orientation 4d (x, y, z, w) | linear 3d | angular 3d   (112 bytes)
+# Velocities here stay in the sample's (parent) frame, unlike odometry_msg's body-frame twist.
+ODOMETRY_MAGIC = b"STOD"
+ODOMETRY_VERSION = 1
+_ODOM_HEADER = struct.Struct("<4sBBxxqI4x")
+_ODOM_SAMPLE = struct.Struct("<B7x13d")
+
+
+def pack_odometry(samples: Sequence[OdometrySample], sim_time_ns: int, sequence: int) -> bytes:
+    parts = [_ODOM_HEADER.pack(ODOMETRY_MAGIC, ODOMETRY_VERSION, len(samples), sim_time_ns, sequence)]
+    for s in samples:
+        parts.append(_ODOM_SAMPLE.pack(FRAME_IDS[s.frame_id], *s.position, *s.orientation, *s.linear, *s.angular))
+    return b"".join(parts)
+
+
+def unpack_odometry(buf) -> Tuple[int, int, List[OdometrySample]]:
+    """Returns:
+        Tuple[int, int, List[OdometrySample]]: sim_time_ns, sequence, samples
+    """
+    magic, version, count, sim_time_ns, sequence = _ODOM_HEADER.unpack_from(buf)
+    if magic != ODOMETRY_MAGIC:
+        raise ValueError(f"Bad odometry magic {magic!r}")
+    if version != ODOMETRY_VERSION:
+        raise ValueError(f"Unsupported odometry version {version} (expected {ODOMETRY_VERSION})")
+    samples = []
+    for i in range(count):
+        frame, *v = _ODOM_SAMPLE.unpack_from(buf, _ODOM_HEADER.size + i * _ODOM_SAMPLE.size)
+        v = np.array(v)
+        samples.append(OdometrySample(FRAME_NAMES[frame], v[0:3], v[3:7], v[7:10], v[10:13]))
+    return sim_time_ns, sequence, samples
+
+
+def packed_odometry_msg(payload: bytes) -> dict:
+    """std_msgs/UInt8MultiArray carrying `payload` (base64, as rosbridge expects for uint8[])."""
+    return {"layout": {"dim": [], "data_offset": 0}, "data": base64.b64encode(payload).decode("ascii")}
+
+
+#############################
+# Frame transforms
+####################
+# Quaternions are x, y, z, w like the sim's Quat_WRT, and rotate body vectors into the frame.
+def quat_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    ax, ay, az, aw = a
+    bx, by, bz, bw = b
+    return np.array([aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw,
+                     aw * bw - ax * bx - ay * by - az * bz])
+
+
+def quat_conjugate(q: np.ndarray) -> np.ndarray:
+    return np.array([-q[0], -q[1], -q[2], q[3]])
+
+
+def quat_to_matrix(q: np.ndarray) -> np.ndarray:
+    x, y, z, w = np.asarray(q, dtype=np.float64) / np.linalg.norm(q)
+    return np.array([[1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+                     [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+                     [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]])
+
+
+def quat_angle(a: np.ndarray, b: np.ndarray) -> float:
+    """Angle (rad) between two orientations, ignoring the q / -q ambiguity."""
+    dot = abs(float(np.dot(a, b))) / (np.linalg.norm(a) * np.linalg.norm(b))
+    return 2.0 * np.arccos(min(1.0, dot))
+
+
+class FrameTransform:
+    """Maps poses from frame A to frame B, for frames that are fixed relative to each other.
+
+    Fit from a single pose expressed in both frames (`fit`), so caching one
+    replaces a sim round trip per conversion with a 3x3 multiply.
+    """
+    def __init__(self, rotation: np.ndarray, translation: np.ndarray, quat: np.ndarray):
+        self.rotation = rotation  # 3x3, A axes -> B axes
+        self.translation = translation  # B position of A's origin
+        self.quat = quat  # same rotation as `rotation`, x, y, z, w
+
+    @classmethod
+    def fit(cls, position_a: np.ndarray, quat_a: np.ndarray,
+            position_b: np.ndarray, quat_b: np.ndarray) -> "FrameTransform":
+        quat = quat_multiply(quat_b, quat_conjugate(quat_a))
+        rotation = quat_to_matrix(quat)
+        return cls(rotation, position_b - rotation @ position_a, quat)
+
+    def position(self, position_a: np.ndarray) -> np.ndarray:
+        return self.rotation @ position_a + self.translation
+
+    def vector(self, vector_a: np.ndarray) -> np.ndarray:
+        """A direction or velocity (no translation)."""
+        return self.rotation @ vector_a
+
+    def orientation(self, quat_a: np.ndarray) -> np.ndarray:
+        return quat_multiply(self.quat, quat_a)
+
+    def matches(self, position_a: np.ndarray, quat_a: np.ndarray, position_b: np.ndarray, quat_b: np.ndarray,
+                tol_m: float = 0.01, tol_rad: float = 1e-4) -> bool:
+        """Whether this transform reproduces a pose read directly in both frames."""
+        return (np.linalg.norm(self.position(position_a) - position_b) <= tol_m
+                and quat_angle(self.orientation(quat_a), quat_b) <= tol_rad)
+
+
+#############################
+# Velocity estimation
+####################
+class VelocityEstimator:
+    """Linear and angular velocity from a ring buffer of timestamped poses in one frame.
+
+    Linear velocity is the least-squares slope of position over the samples in the
+    last `window_s` of sim time, so one noisy or late sample doesn't spike it; for
+    an accelerating vehicle it lags by about half the window. Angular velocity is
+    the rotation between the oldest and newest orientation in the window. Both are
+    in the frame the poses are expressed in. Times are sim nanoseconds, so the
+    estimates stay correct under time warp. The window is also capped at the last
+    `capacity` samples.
+    """
+    def __init__(self, window_s: float = 0.2, capacity: int = 256):
+        self.window_ns = int(window_s * 1e9)
+        self.capacity = capacity
+        self._t = np.zeros(capacity, dtype=np.int64)
+        self._position = np.zeros((capacity, 3))
+        self._orientation = np.zeros((capacity, 4))
+        self._head = 0  # next slot to write
+        self._count = 0
+
+    def reset(self) -> None:
+        self._head = 0
+        self._count = 0
+
+    def add(self, t_ns: int, position: np.ndarray, orientation: np.ndarray) -> None:
+        if self._count:
+            newest = (self._head - 1) % self.capacity
+            if t_ns < self._t[newest]:
+                self.reset()  # sim clock went backwards (reset/rewind); old samples no longer apply
+            elif t_ns == self._t[newest]:
+                self._head = newest  # sim paused: replace rather than add a zero-dt sample
+                self._count -= 1
+        self._t[self._head] = t_ns
+        self._position[self._head] = position
+        self._orientation[self._head] = orientation
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def estimate(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(linear m/s, angular rad/s) over the current window; zeros until two samples span it."""
+        idx = (self._head - 1 - np.arange(self._count)) % self.capacity  # newest first
+        idx = idx[self._t[idx] >= self._t[idx[0]] - self.window_ns] if self._count else idx
+        if len(idx) < 2:
+            return np.zeros(3), np.zeros(3)
+
+        t = (self._t[idx] - self._t[idx[0]]) * 1e-9
+        t -= t.mean()
+        position = self._position[idx]
+        linear = t @ (position - position.mean(axis=0)) / (t @ t)
+
+        newest, oldest = self._orientation[idx[0]], self._orientation[idx[-1]]
+        delta = quat_multiply(newest, quat_conjugate(oldest))
+        if delta[3] < 0:
+            delta = -delta  # shortest way round
+        sin_half = np.linalg.norm(delta[:3])
+        span_s = (self._t[idx[0]] - self._t[idx[-1]]) * 1e-9
+        angular = np.zeros(3)
+        if sin_half > 0:
+            angular = delta[:3] / sin_half * (2.0 * np.arctan2(sin_half, delta[3]) / span_s)
+        return linear, angular
+
+
+#############################
+# History
+####################
+# Not served yet: the intended rosbridge service needs a type that isn't in
+# space_teams_definitions, and rosbridge rejects advertising an unknown one.
+# Once it exists, ROS_Telemetry can keep the last N ticks in a TelemetryHistory
+# and answer with pack_history() output:
+#   space_teams_definitions/OdometryHistory
+#     request:  builtin_interfaces/Time start, builtin_interfaces/Time end, int32 last_n
+#     response: bool success, uint32 count, uint8[] data
+#   last_n > 0 returns the newest last_n ticks, otherwise every tick stamped in
+#   [start, end] (ros_time_to_ns; end of zero = up to the newest).
+#
+# One row per tick, every frame's sample laid out like a packed odometry sample
+ODOMETRY_SAMPLE_DTYPE = np.dtype([
+    ("frame", "u1"),
+    ("pad", "V7"),
+    ("position", "<f8", (3,)),
+    ("orientation", "<f8", (4,)),
+    ("linear", "<f8", (3,)),
+    ("angular", "<f8", (3,)),
+])
+assert ODOMETRY_SAMPLE_DTYPE.itemsize == _ODOM_SAMPLE.size
+HISTORY_DTYPE = np.dtype([
+    ("sim_time_ns", "<i8"),
+    ("samples", ODOMETRY_SAMPLE_DTYPE, (len(FRAME_IDS),)),
+])
+
+# Packed history: magic 4s | version B | frames per row B | pad 2 | row count I | pad 4   (16 bytes),
+# then the rows as HISTORY_DTYPE
+HISTORY_MAGIC = b"STOH"
+HISTORY_VERSION = 1
+_HISTORY_HEADER = struct.Struct("<4sBBxxI4x")
+
+
+class TelemetryHistory:
+    """Fixed-size ring buffer of odometry rows, oldest overwritten first.
+
+    Memory is `capacity` HISTORY_DTYPE rows, allocated up front. Rows stay sorted
+    by sim time (a clock that goes backwards clears the buffer, a paused one
+    replaces the newest row), so lookups are binary searches over the ring's at
+    most two contiguous segments. Appends come from the telemetry loop and
+    queries from rosbridge's thread, so both take a lock; queries return copies.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._rows = np.zeros(capacity, dtype=HISTORY_DTYPE)
+        self._head = 0  # next slot to write
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, sim_time_ns: int, samples: Sequence[OdometrySample]) -> None:
+        with self._lock:
+            if self._count:
+                newest = (self._head - 1) % self.capacity
+                if sim_time_ns < self._rows["sim_time_ns"][newest]:
+                    self._count = 0
+                elif sim_time_ns == self._rows["sim_time_ns"][newest]:
+                    self._head = newest
+                    self._count -= 1
+            row = self._rows[self._head]
+            row["sim_time_ns"] = sim_time_ns
+            for i, s in enumerate(samples):
+                row["samples"][i] = (FRAME_IDS[s.frame_id], b"", s.position, s.orientation, s.linear, s.angular)
+            self._head = (self._head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def _segments(self) -> List[np.ndarray]:
+        """The stored rows, oldest first, as one or two views into the ring."""
+        start = (self._head - self._count) % self.capacity
+        end = start + self._count
+        if end <= self.capacity:
+            return [self._rows[start:end]]
+        return [self._rows[start:], self._rows[:end - self.capacity]]
+
+    def _search(self, sim_time_ns: int, side: str) -> int:
+        """np.searchsorted over the rows in age order (0 = oldest)."""
+        offset = 0
+        for segment in self._segments():
+            i = int(np.searchsorted(segment["sim_time_ns"], sim_time_ns, side))
+            if i < len(segment):
+                return offset + i
+            offset += len(segment)
+        return offset
+
+    def _take(self, lo: int, hi: int) -> np.ndarray:
+        start = (self._head - self._count) % self.capacity
+        idx = (start + np.arange(lo, hi)) % self.capacity
+        return self._rows[idx]
+
+    def between(self, start_ns: int, end_ns: int) -> np.ndarray:
+        """Rows with start_ns <= sim_time_ns <= end_ns."""
+        with self._lock:
+            return self._take(self._search(start_ns, "left"), self._search(end_ns, "right"))
+
+    def last(self, n: int) -> np.ndarray:
+        with self._lock:
+            return self._take(max(0, self._count - n), self._count)
+
+
+def pack_history(rows: np.ndarray) -> bytes:
+    header = _HISTORY_HEADER.pack(HISTORY_MAGIC, HISTORY_VERSION, len(FRAME_IDS), len(rows))
+    return header + rows.astype(HISTORY_DTYPE, copy=False).tobytes()
+
+
+def unpack_history(buf) -> np.ndarray:
+    """HISTORY_DTYPE rows from `pack_history` output; frame names via FRAME_NAMES[row["samples"]["frame"]]."""
+    magic, version, frames, count = _HISTORY_HEADER.unpack_from(buf)
+    if magic != HISTORY_MAGIC:
+        raise ValueError(f"Bad history magic {magic!r}")
+    if version != HISTORY_VERSION:
+        raise ValueError(f"Unsupported history version {version} (expected {HISTORY_VERSION})")
+    if frames != len(FRAME_IDS):
+        raise ValueError(f"History has {frames} frames per row, expected {len(FRAME_IDS)}")
+    return np.frombuffer(buf, dtype=HISTORY_DTYPE, count=count, offset=_HISTORY_HEADER.size)
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ImageTransport import DEPTH_NODATA_CM, STREAM_CODECS, FrameHeader, make_codec
+
+
+def synthetic_rgb(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Smooth terrain-like gradients plus sensor-ish noise, so codecs aren't flattered."""
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    base = np.stack([np.sin(6 * x + 2 * y), np.cos(5 * y - x), np.sin(3 * (x + y))], axis=2) * 90 + 128
+    base += rng.normal(0.0, 6.0, base.shape)
+    return np.clip(base, 0, 255).astype(np.uint8)
+
+
+def synthetic_depth(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Ground plane receding to the horizon (cm), with sky as nodata."""
+    rows = np.arange(size, dtype=np.float32)[:, None]
+    horizon = size * 0.4
+    depth = np.where(rows > horizon, 150.0 * size / np.maximum(rows - horizon, 1.0), DEPTH_NODATA_CM)
+    depth = np.broadcast_to(depth, (size, size)).astype(np.float32)
+    depth = depth + rng.normal(0.0, 0.3, depth.shape).astype(np.float32)
+    depth[depth > 20_000.0] = DEPTH_NODATA_CM
+    return depth
+
+
+def bench(stream: str, codec_name: str, frame: np.ndarray, reps: int, quality: int) -> dict:
+    codec = make_codec(codec_name, quality)
+    payload = codec.encode(frame)
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        payload = codec.encode(frame)
+    encode_ms = (time.perf_counter() - t0) * 1000 / reps
+
+    size = memoryview(payload).nbytes
+    header = FrameHeader.for_frame(stream, frame, payload_bytes=size, codec=codec.name)
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        decoded = codec.decode(payload, header)
+    decode_ms = (time.perf_counter() - t0) * 1000 / reps
+
+    valid = np.ones(frame.shape, dtype=bool)
+    nodata_added = 0
+    if stream == "DEPTH":
+        # Error over the pixels the codec kept; ranges it can't represent become nodata instead
+        kept = decoded < DEPTH_NODATA_CM
+        nodata_added = int(np.count_nonzero((frame < DEPTH_NODATA_CM) & ~kept))
+        valid = (frame < DEPTH_NODATA_CM) & kept
+    err = np.abs(decoded.astype(np.float64)[valid] - frame.astype(np.float64)[valid])
+    return {
+        "stream": stream,
+        "codec": codec_name,
+        "resolution": frame.shape[0],
+        "raw_bytes": frame.nbytes,
+        "bytes": size,
+        "bytes_saved_pct": 100.0 * (1.0 - size / frame.nbytes),
+        "encode_ms": encode_ms,
+        "decode_ms": decode_ms,
+        "p99_abs_err": float(np.percentile(err, 99)),
+        "max_abs_err": float(err.max()),
+        "nodata_added_pct": 100.0 * nodata_added / frame.size,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ImagePublisher codec benchmark: encode time vs bytes saved")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024, 2048], help="Square resolutions to test")
+    ap.add_argument("--reps", type=int, default=20, help="Encodes per measurement")
+    ap.add_argument("--quality", type=int, default=-1, help="Codec quality (-1 = codec default)")
+    ap.add_argument("--json", default="", help="Also write results to this JSON file")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    print(f"{'stream':<6} {'codec':<9} {'res':>5} {'bytes':>10} {'saved':>7} {'enc ms':>8} {'dec ms':>8} {'p99 err':>9} {'max err':>9} {'+nodata':>8}")
+    for size in args.sizes:
+        frames = {"RGB": synthetic_rgb(size, rng), "DEPTH": synthetic_depth(size, rng)}
+        for stream, codecs in STREAM_CODECS.items():
+            if stream not in frames:
+                continue
+            for codec_name in codecs:
+                try:
+                    r = bench(stream, codec_name, frames[stream], args.reps, args.quality)
+                except ImportError as e:
+                    print(f"{stream:<6} {codec_name:<9} {size:>5}  skipped: {e}")
+                    continue
+                results.append(r)
+                print(f"{stream:<6} {codec_name:<9} {size:>5} {r['bytes']:>10,} {r['bytes_saved_pct']:>6.1f}% "
+                      f"{r['encode_ms']:>8.2f} {r['decode_ms']:>8.2f} {r['p99_abs_err']:>9.3f} {r['max_abs_err']:>9.3f} "
+                      f"{r['nodata_added_pct']:>7.2f}%")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+
+if __name__ == "__main__":
+    main()
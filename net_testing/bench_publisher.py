@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import zmq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ImagePublisher import CameraConfig, ImagePublisher
+from ImageTransport import (TRANSPORT_MULTIPART, TRANSPORT_SHM, TRANSPORT_SINGLE, TRANSPORTS, STREAM_CODECS,
+                            ShmFrameSubscriber, recv_frame_multipart)
+
+STREAM_SETS = {"rgb": ("RGB",), "depth": ("DEPTH",), "both": ("RGB", "DEPTH")}
+
+
+def subscribe(host: str, port: int, transport: str, duration: float, ready=None) -> dict:
+    """Count what arrives for `duration` seconds: frames and bytes per stream, plus sequence gaps."""
+    context = zmq.Context()
+    if transport == TRANSPORT_SHM:
+        shm_sub = ShmFrameSubscriber(host, port, context, conflate=False)  # "both" shares the port
+        socket = shm_sub.socket
+    else:
+        shm_sub = None
+        socket = context.socket(zmq.SUB)
+        socket.setsockopt(zmq.SUBSCRIBE, b"")
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(f"tcp://{host}:{port}")
+    if ready is not None:
+        ready()
+
+    frames, nbytes, gaps, last_seq = {}, {}, {}, {}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        if not socket.poll(100):
+            continue
+        if transport == TRANSPORT_SINGLE:
+            msg = socket.recv(copy=False)
+            stream = msg.buffer[:8].tobytes().split(b"#", 1)[0].decode("ascii")  # TYPE#HEIGHT#...
+            size, seq = len(msg), None
+        elif transport == TRANSPORT_MULTIPART:
+            header, pixels, _ = recv_frame_multipart(socket)
+            stream, size, seq = header.stream, header.payload_bytes, header.sequence
+        else:
+            frame = shm_sub.recv()
+            if frame is None:
+                continue  # overwritten before we read it; shows up as a gap below
+            header, _ = frame
+            stream, size, seq = header.stream, header.payload_bytes, header.sequence
+        frames[stream] = frames.get(stream, 0) + 1
+        nbytes[stream] = nbytes.get(stream, 0) + size
+        if seq is not None:
+            if stream in last_seq:
+                gaps[stream] = gaps.get(stream, 0) + max(0, seq - last_seq[stream] - 1)
+            last_seq[stream] = seq
+
+    if shm_sub is not None:
+        shm_sub.close()
+    else:
+        socket.close(0)
+    context.term()
+    return {"frames": frames, "bytes": nbytes, "sequence_gaps": gaps if transport != TRANSPORT_SINGLE else None}
+
+
+def run_case(args, port: int, streams, size: int, transport: str, codecs: dict, subscriber: str) -> dict:
+    publisher = ImagePublisher("127.0.0.1", port, transport=transport, codecs=codecs, quality=args.quality)
+    config = CameraConfig(width=size, height=size)
+    publisher.setup_rgb_camera(config)
+    publisher.setup_depth_camera(config)
+    # Generate once and reuse, so the numbers are about _send_frame and not the test pattern
+    frames = [(s, publisher._generate_rgb_frame() if s == "RGB" else publisher._generate_depth_frame())
+              for s in streams]
+
+    sub_time = args.duration + args.settle_s + 1.0
+    result = {}
+    if subscriber == "thread":
+        ready = threading.Event()
+        thread = threading.Thread(target=lambda: result.update(
+            subscribe("127.0.0.1", port, transport, sub_time, ready.set)), daemon=True)
+        thread.start()
+        ready.wait()
+    else:
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--subscriber", "--port", str(port),
+                                 "--transport", transport, "--duration", str(sub_time)],
+                                stdout=subprocess.PIPE, text=True)
+        proc.stdout.readline()  # "ready"
+    time.sleep(args.settle_s)  # let the SUBSCRIBE reach the publisher
+
+    published = 0
+    period = 1.0 / args.fps if args.fps > 0 else 0.0
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    next_time = start
+    while time.perf_counter() - start < args.duration:
+        for stream, frame in frames:
+            if stream == "RGB":
+                publisher.publish_RGB_frame(frame, published)
+            else:
+                publisher.publish_Depth_frame(frame, published)
+            published += 1
+        if period:
+            next_time += period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    elapsed = time.perf_counter() - start
+    cpu_s = time.thread_time() - cpu_start
+
+    if subscriber == "thread":
+        thread.join()
+    else:
+        result.update(json.loads(proc.communicate()[0]))
+    sent = sum(c.sent for c in publisher.channels.values())
+    bytes_sent = sum(c.bytes_sent for c in publisher.channels.values())
+    publisher.cleanup()
+
+    received = sum(result["frames"].values())
+    gaps = result["sequence_gaps"]
+    return {
+        "streams": "+".join(streams),
+        "resolution": size,
+        "transport": transport,
+        "codecs": codecs,
+        "subscriber": subscriber,
+        "published_fps": published / elapsed,
+        "sent_fps": sent / elapsed,
+        "received_fps": received / elapsed,
+        "bytes_per_s": bytes_sent / elapsed,
+        "received_bytes_per_s": sum(result["bytes"].values()) / elapsed,
+        "cpu_ms_per_frame": cpu_s * 1000 / max(published, 1),
+        "drops": published - received,  # end to end: never sent, or lost or conflated on the way
+        "sequence_gaps": None if gaps is None else sum(gaps.values()),
+        "received": result["frames"],
+    }
+
+
+def codec_options(streams, transport: str, args):
+    """Codec assignments to try: raw everywhere, then each requested codec of every stream present."""
+    options = [{s: "raw" for s in streams}]
+    if transport == TRANSPORT_SINGLE:
+        return options  # the legacy header can't describe encoded payloads
+    requested = {"RGB": args.rgb_codecs, "DEPTH": args.depth_codecs}
+    for stream in streams:
+        for name in requested[stream]:
+            if name != "raw":
+                options.append({**{s: "raw" for s in streams}, stream: name})
+    return options
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ImagePublisher throughput benchmark: FPS, bytes/s, CPU and drops")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024, 2048], help="Square resolutions")
+    ap.add_argument("--streams", nargs="+", choices=list(STREAM_SETS), default=list(STREAM_SETS))
+    ap.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    ap.add_argument("--rgb-codecs", nargs="+", choices=STREAM_CODECS["RGB"], default=list(STREAM_CODECS["RGB"]))
+    ap.add_argument("--depth-codecs", nargs="+", choices=STREAM_CODECS["DEPTH"],
+                    default=list(STREAM_CODECS["DEPTH"]))
+    ap.add_argument("--subscribers", nargs="+", choices=["thread", "loopback"], default=["thread", "loopback"],
+                    help="Subscriber thread in this process, or a separate process; both connect over 127.0.0.1 TCP")
+    ap.add_argument("--quality", type=int, default=-1, help="Codec quality (-1 = codec default)")
+    ap.add_argument("--duration", type=float, default=2.0, help="Seconds of publishing per case")
+    ap.add_argument("--fps", type=float, default=0.0, help="Publish rate per stream (0 = as fast as possible)")
+    ap.add_argument("--settle-s", type=float, default=0.3, help="Wait for subscribers to connect")
+    ap.add_argument("--port", type=int, default=56100, help="First port; each case uses the next one")
+    ap.add_argument("--json", default="", help="Also write results to this JSON file")
+    # Internal: run as the loopback subscriber
+    ap.add_argument("--subscriber", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--transport", default=TRANSPORT_SINGLE, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.subscriber:
+        result = subscribe("127.0.0.1", args.port, args.transport, args.duration,
+                           lambda: print("ready", flush=True))
+        print(json.dumps(result))
+        return
+
+    port = args.port
+    results = []
+    print(f"{'streams':<10} {'res':>5} {'transport':<10} {'codecs':<18} {'sub':<8} {'pub fps':>8} {'rx fps':>8} "
+          f"{'MB/s':>8} {'cpu ms':>7} {'drops':>6} {'gaps':>6}")
+    for size in args.sizes:
+        for set_name in args.streams:
+            streams = STREAM_SETS[set_name]
+            for transport in args.transports:
+                for codecs in codec_options(streams, transport, args):
+                    for subscriber in args.subscribers:
+                        try:
+                            r = run_case(args, port, streams, size, transport, codecs, subscriber)
+                        except ImportError as e:
+                            print(f"{set_name:<10} {size:>5} {transport:<10} {'/'.join(codecs.values()):<18} skipped: {e}")
+                            continue
+                        finally:
+                            port += 1
+                        results.append(r)
+                        gaps = "-" if r["sequence_gaps"] is None else r["sequence_gaps"]
+                        print(f"{set_name:<10} {size:>5} {transport:<10} {'/'.join(codecs.values()):<18} "
+                              f"{subscriber:<8} {r['published_fps']:>8.1f} {r['received_fps']:>8.1f} "
+                              f"{r['bytes_per_s'] / 1e6:>8.1f} {r['cpu_ms_per_frame']:>7.2f} "
+                              f"{r['drops']:>6} {gaps:>6}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Check that a stalled subscriber makes ImageSender's adaptive mode back off.
+
+Publishes JPEG RGB frames over the multipart transport to a subscriber that
+connects and never reads, with a RateController fed by the publisher's
+send_failures the way ImageSender's backpressure_counters feeds it. Once the
+subscriber's HWM fills, sends must fail, and the controller must lower the
+stream's rate scale and quality. A subscriber that keeps up is run first as the
+control: no failures, nothing lowered. Exits non-zero if either case fails.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import zmq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ImagePublisher import CameraConfig, ImagePublisher
+from ImageTransport import TRANSPORT_MULTIPART, recv_frame_multipart
+from Scheduling import RateController
+
+
+def drain(socket: zmq.Socket, stop: threading.Event) -> None:
+    while not stop.is_set():
+        if socket.poll(50):
+            recv_frame_multipart(socket)
+
+
+def run(args, port: int, stalled: bool) -> dict:
+    publisher = ImagePublisher("127.0.0.1", port, transport=TRANSPORT_MULTIPART, codecs={"RGB": "jpeg"},
+                               quality=args.quality)
+    publisher.setup_rgb_camera(CameraConfig(width=args.size, height=args.size))
+    frame = publisher._generate_rgb_frame()
+
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, 2)
+    socket.setsockopt(zmq.RCVBUF, 64 * 1024)  # keep the kernel from soaking up the backlog
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.SUBSCRIBE, b"")
+    socket.connect(f"tcp://127.0.0.1:{port}")
+    stop = threading.Event()
+    reader = None
+    if not stalled:
+        reader = threading.Thread(target=drain, args=(socket, stop), daemon=True)
+        reader.start()
+    time.sleep(args.settle_s)  # let the SUBSCRIBE reach the publisher
+
+    controller = RateController(
+        ["RGB"], lambda s: (publisher.send_failures.get(s, 0), publisher.sequences.get(s, 0), None),
+        window_s=args.window_s, quality_caps={"RGB": args.quality},
+        set_quality=publisher.set_quality, log=print)
+
+    start = time.perf_counter()
+    next_time = start
+    published = 0
+    while time.perf_counter() - start < args.duration:
+        publisher.publish_RGB_frame(frame, published)
+        published += 1
+        controller.update()
+        next_time += 1.0 / (args.fps * controller.scale("RGB"))
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    stop.set()
+    if reader is not None:
+        reader.join()
+    socket.close(0)
+    context.term()
+    result = {"published": published, "send_failures": publisher.send_failures.get("RGB", 0),
+              "scale": round(controller.scale("RGB"), 3), "quality": controller.quality.get("RGB")}
+    publisher.cleanup()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check that a stalled subscriber lowers the adaptive rate and quality")
+    ap.add_argument("--size", type=int, default=512, help="Square resolution")
+    ap.add_argument("--fps", type=float, default=60.0, help="Configured publish rate")
+    ap.add_argument("--quality", type=int, default=90, help="JPEG quality cap")
+    ap.add_argument("--window-s", type=float, default=0.5, help="RateController window")
+    ap.add_argument("--duration", type=float, default=5.0, help="Seconds of publishing per case")
+    ap.add_argument("--settle-s", type=float, default=0.3, help="Wait for the subscriber to connect")
+    ap.add_argument("--port", type=int, default=56300)
+    args = ap.parse_args()
+
+    failures = []
+    control = run(args, args.port, stalled=False)
+    print(f"reading subscriber: {control}")
+    if control["send_failures"] or control["scale"] < 1.0 or control["quality"] != args.quality:
+        failures.append("a subscriber that keeps up still triggered backpressure")
+
+    stalled = run(args, args.port + 1, stalled=True)
+    print(f"stalled subscriber: {stalled}")
+    if not stalled["send_failures"]:
+        failures.append("no send failures with a stalled subscriber")
+    if stalled["scale"] >= 1.0:
+        failures.append("rate scale not lowered")
+    if stalled["quality"] >= args.quality:
+        failures.append("quality not lowered")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Check that ImageSubscriber's pending queues stay bounded without conflation.
+
+Publishes alternating RGB and depth frames on one shared port and reads them
+with `recv(stream="RGB")` on a non-conflating subscriber, so every depth frame
+is left undelivered. The depth queue must stop at `max_pending` (the rest counted
+as evicted), and so must the pixel bytes it holds on to (ZMQ message buffers,
+which tracemalloc can't see). Exits non-zero otherwise.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ImagePublisher import CameraConfig, ImagePublisher
+from ImageSubscriber import ImageSubscriber
+from ImageTransport import TRANSPORT_MULTIPART
+
+
+def pending_bytes(subscriber: ImageSubscriber) -> int:
+    return sum(frame.pixels.nbytes for queue in subscriber._pending.values() for frame in queue)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check ImageSubscriber memory with an unread stream")
+    ap.add_argument("--size", type=int, default=256, help="Square resolution")
+    ap.add_argument("--frames", type=int, default=400, help="RGB/depth frame pairs to publish")
+    ap.add_argument("--max-pending", type=int, default=32)
+    ap.add_argument("--interval-ms", type=float, default=5.0, help="Pause between pairs, so the publisher's HWM drains")
+    ap.add_argument("--settle-s", type=float, default=0.3, help="Wait for the subscriber to connect")
+    ap.add_argument("--port", type=int, default=56400)
+    args = ap.parse_args()
+
+    publisher = ImagePublisher("127.0.0.1", args.port, transport=TRANSPORT_MULTIPART)
+    config = CameraConfig(width=args.size, height=args.size)
+    publisher.setup_rgb_camera(config)
+    publisher.setup_depth_camera(config)
+    rgb, depth = publisher._generate_rgb_frame(), publisher._generate_depth_frame()
+    subscriber = ImageSubscriber("127.0.0.1", args.port, transport=TRANSPORT_MULTIPART, conflate=False,
+                                 max_pending=args.max_pending)
+    time.sleep(args.settle_s)  # let the SUBSCRIBE reach the publisher
+
+    received = 0
+    halfway_bytes = 0
+    for i in range(args.frames):
+        publisher.publish_RGB_frame(rgb, i)
+        publisher.publish_Depth_frame(depth, i)
+        if subscriber.recv(timeout_ms=100, stream="RGB") is not None:
+            received += 1
+        time.sleep(args.interval_ms / 1000)
+        if i == args.frames // 2:
+            halfway_bytes = pending_bytes(subscriber)
+    end_bytes = pending_bytes(subscriber)
+
+    pending = {s: len(q) for s, q in subscriber._pending.items()}
+    depth_stats = subscriber.stats()["DEPTH"]
+    subscriber.close()
+    publisher.cleanup()
+    frame_bytes = depth.nbytes
+    print(f"received {received} RGB, {depth_stats['received']} depth, pending {pending}, "
+          f"depth evicted {depth_stats['evicted']}, "
+          f"held halfway {halfway_bytes / 1e6:.1f} MB, end {end_bytes / 1e6:.1f} MB")
+
+    failures = []
+    if depth_stats["received"] < 2 * args.max_pending:
+        failures.append(f"only {depth_stats['received']} depth frames received, too few to fill the queue")
+    if pending["DEPTH"] > args.max_pending:
+        failures.append(f"depth queue grew to {pending['DEPTH']} > {args.max_pending}")
+    if depth_stats["evicted"] != depth_stats["received"] - pending["DEPTH"]:
+        failures.append(f"{depth_stats['evicted']} depth frames evicted, expected "
+                        f"{depth_stats['received'] - pending['DEPTH']}")
+    # Past the halfway point the queue is full, so what it holds must not grow
+    if end_bytes > halfway_bytes or end_bytes > args.max_pending * frame_bytes:
+        failures.append(f"held frames grew from {halfway_bytes / 1e6:.1f} MB to {end_bytes / 1e6:.1f} MB")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()